@@ -0,0 +1,376 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import time
+import numpy as np
+from humanoid import STATE_INDEX
+from humanoid_env_rl import HumanoidEnv, MAX_MOTOR_SPEED
+from model import PPO_CONFIG
+from simulation import Simulation
+
+# Suite metrics and whether a higher value is better
+METRICS = {
+    'physics_steps_per_sec': True,
+    'env_steps_per_sec': True,
+    'env_steps_per_sec_no_obs_reward': True,
+    'reset_latency_us': False,
+    'construct_latency_us': False,
+    'render_fps': True,
+    'vec_env_steps_per_sec': True,
+    'ppo_samples_per_sec': True,
+}
+
+def _random_actions(steps, seed=0):
+    return np.random.default_rng(seed).uniform(-1, 1, (steps, 4)).astype(np.float32)
+
+def measure_env_steps(frame_skip, steps=5000, seed=0):
+    """
+    Time a headless HumanoidEnv driven with random actions.
+
+    Returns:
+        float: Environment (policy) steps per second.
+    """
+    env = HumanoidEnv(headless=True, frame_skip=frame_skip)
+    actions = _random_actions(steps, seed)
+    env.reset()
+    start = time.perf_counter()
+    for action in actions:
+        done = env.step(action)[2]
+        if done:
+            env.reset()
+    return steps / (time.perf_counter() - start)
+
+def measure_sample_efficiency(frame_skip, timesteps, eval_seconds=10.0):
+    """
+    Train PPO for a number of environment steps and measure how far the policy walks.
+
+    The distance is measured over the same simulated duration for every frame_skip,
+    so settings that see fewer samples per simulated second are compared fairly.
+
+    Returns:
+        tuple: Torso distance walked in eval_seconds, and training time in seconds.
+    """
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.monitor import Monitor
+
+    env = Monitor(HumanoidEnv(headless=True, frame_skip=frame_skip))
+    model = PPO(policy="MlpPolicy", env=env, verbose=0, seed=0, **PPO_CONFIG)
+    start = time.perf_counter()
+    model.learn(total_timesteps=timesteps)
+    train_time = time.perf_counter() - start
+
+    obs = env.reset()[0]
+    start_x = obs[STATE_INDEX['torso_x']]
+    simulation = env.unwrapped.simulation
+    for _ in range(int(round(eval_seconds / (simulation.time_step * frame_skip)))):
+        action, _states = model.predict(obs, deterministic=True)
+        obs, reward, done, _, info = env.step(action)
+        if done:
+            break
+    return float(obs[STATE_INDEX['torso_x']] - start_x), train_time
+
+def bench_frame_skip(frame_skips, steps, timesteps):
+    """
+    Benchmark each action repeat setting.
+
+    Returns:
+        list: One dict of results per frame_skip.
+    """
+    results = []
+    for frame_skip in frame_skips:
+        env_steps_per_sec = measure_env_steps(frame_skip, steps)
+        result = {
+            'frame_skip': frame_skip,
+            'env_steps_per_sec': env_steps_per_sec,
+            'physics_steps_per_sec': env_steps_per_sec * frame_skip,
+        }
+        if timesteps > 0:
+            result['distance'], result['train_time'] = measure_sample_efficiency(frame_skip, timesteps)
+        results.append(result)
+    return results
+
+def bench_physics(steps):
+    """Raw Box2D steps per second of a headless Simulation."""
+    simulation = Simulation(headless=True)
+    simulation.humanoid.update_motors([MAX_MOTOR_SPEED, -MAX_MOTOR_SPEED, MAX_MOTOR_SPEED, -MAX_MOTOR_SPEED])
+    world = simulation.world
+    start = time.perf_counter()
+    for _ in range(steps):
+        world.Step(simulation.time_step, simulation.velocity_iterations, simulation.position_iterations)
+    return steps / (time.perf_counter() - start)
+
+def bench_env_steps(steps):
+    """HumanoidEnv.step calls per second, with observation, reward and termination."""
+    return measure_env_steps(1, steps)
+
+def bench_env_steps_no_obs_reward(steps):
+    """Environment steps per second without reading the state or computing the reward."""
+    simulation = Simulation(headless=True)
+    actions = _random_actions(steps)
+    start = time.perf_counter()
+    for action in actions:
+        simulation.step(action * MAX_MOTOR_SPEED)
+    return steps / (time.perf_counter() - start)
+
+def bench_reset(steps):
+    """Mean latency of HumanoidEnv.reset() after a short episode, in microseconds."""
+    env = HumanoidEnv(headless=True)
+    action = np.ones(4, dtype=np.float32)
+    resets = max(1, steps // 50)
+    total = 0.0
+    for _ in range(resets):
+        for _ in range(20):
+            env.step(action)
+        start = time.perf_counter()
+        env.reset()
+        total += time.perf_counter() - start
+    return total / resets * 1e6
+
+def bench_construct(steps):
+    """Mean latency of building a headless Simulation, in microseconds."""
+    count = max(1, steps // 50)
+    start = time.perf_counter()
+    for _ in range(count):
+        Simulation(headless=True)
+    return (time.perf_counter() - start) / count * 1e6
+
+def bench_render(steps):
+    """Offscreen rgb_array frames per second at full resolution."""
+    env = HumanoidEnv(headless=True, render_mode="rgb_array")
+    env.reset()
+    frames = max(1, steps // 10)
+    actions = _random_actions(frames)
+    env.render()
+    total = 0.0
+    for action in actions:
+        env.step(action)
+        start = time.perf_counter()
+        env.render()
+        total += time.perf_counter() - start
+    return frames / total
+
+# Benchmarks measured in independent processes, one copy per worker
+SINGLE_PROCESS_BENCHMARKS = {
+    'physics_steps_per_sec': bench_physics,
+    'env_steps_per_sec': bench_env_steps,
+    'env_steps_per_sec_no_obs_reward': bench_env_steps_no_obs_reward,
+    'reset_latency_us': bench_reset,
+    'construct_latency_us': bench_construct,
+    'render_fps': bench_render,
+}
+
+def _run_benchmark(item):
+    name, steps = item
+    return SINGLE_PROCESS_BENCHMARKS[name](steps)
+
+def run_in_processes(name, workers, steps):
+    """
+    Run a single process benchmark in several processes at once.
+
+    Returns:
+        float: The summed throughput, or the mean latency for latency metrics.
+    """
+    with mp.get_context("spawn").Pool(workers) as pool:
+        values = pool.map(_run_benchmark, [(name, steps)] * workers)
+    return sum(values) if METRICS[name] else sum(values) / len(values)
+
+def bench_vec_env(workers, steps, envs_per_worker=8):
+    """Member steps per second of a SharedMemoryVecEnv."""
+    from parallel_vec_env import SharedMemoryVecEnv
+
+    env = SharedMemoryVecEnv(workers * envs_per_worker, num_workers=workers)
+    actions = _random_actions(env.num_envs)
+    env.reset()
+    batches = max(1, steps // env.num_envs)
+    start = time.perf_counter()
+    for _ in range(batches):
+        env.step(actions)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return batches * env.num_envs / elapsed
+
+def bench_ppo(workers, steps):
+    """End to end PPO samples per second (rollouts and updates), model.py settings."""
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import VecMonitor
+    from parallel_vec_env import SharedMemoryVecEnv
+
+    if workers > 1:
+        env = VecMonitor(SharedMemoryVecEnv(workers, num_workers=workers))
+    else:
+        env = Monitor(HumanoidEnv(headless=True))
+    n_steps = max(64, steps // (10 * workers))
+    model = PPO(policy="MlpPolicy", env=env, verbose=0, seed=0, device="cpu", **dict(PPO_CONFIG, n_steps=n_steps))
+    timesteps = n_steps * workers * 2
+    start = time.perf_counter()
+    model.learn(total_timesteps=timesteps)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return timesteps / elapsed
+
+def run_suite(worker_counts, steps, repeats):
+    """
+    Run every suite benchmark at each worker count, keeping the best of the repeats.
+
+    Returns:
+        dict: Results keyed by "<metric>@<workers>".
+    """
+    results = {}
+    for workers in worker_counts:
+        for name in METRICS:
+            values = []
+            for _ in range(repeats):
+                if name == 'vec_env_steps_per_sec':
+                    values.append(bench_vec_env(workers, steps))
+                elif name == 'ppo_samples_per_sec':
+                    values.append(bench_ppo(workers, steps))
+                else:
+                    values.append(run_in_processes(name, workers, steps))
+            results[f'{name}@{workers}'] = max(values) if METRICS[name] else min(values)
+            print(f"{name + '@' + str(workers):>40}: {results[f'{name}@{workers}']:.1f}", flush=True)
+    return results
+
+def compare(report, baseline, tolerance):
+    """
+    Compare a suite report against a baseline report.
+
+    A baseline metric missing from the report, e.g. renamed or measured at other worker
+    counts, fails the comparison rather than being skipped.
+
+    Returns:
+        list: Messages for the metrics worse than the baseline by more than the tolerance,
+        the baseline metrics not measured and a different set of worker counts.
+    """
+    failures = []
+    results = report['results']
+    worker_counts = baseline['meta'].get('worker_counts')
+    if worker_counts is not None and worker_counts != report['meta']['worker_counts']:
+        failures.append(f"worker counts: {report['meta']['worker_counts']} != {worker_counts} (baseline)")
+    for key, reference in baseline['results'].items():
+        if key not in results:
+            failures.append(f"{key}: not measured, {reference:.1f} in the baseline")
+            continue
+        value = results[key]
+        higher_is_better = METRICS[key.split('@')[0]]
+        if higher_is_better and value < reference * (1 - tolerance):
+            failures.append(f"{key}: {value:.1f} < {reference:.1f} (baseline)")
+        elif not higher_is_better and value > reference * (1 + tolerance):
+            failures.append(f"{key}: {value:.1f} > {reference:.1f} (baseline)")
+    return failures
+
+def check_snapshot_determinism(seeds=5, warmup=100, branch_steps=100, steps=200):
+    """
+    Check that restoring a snapshot gives the same rollout in any environment.
+
+    For each seed, a snapshot taken after `warmup` random steps is restored both into the
+    environment it came from, after `branch_steps` more steps, and into a fresh one. Both
+    must then follow the same `steps` random actions exactly.
+
+    Returns:
+        list: A message per seed whose rollouts differ, empty when all match.
+    """
+    failures = []
+    for seed in range(seeds):
+        actions = _random_actions(warmup + branch_steps + steps, seed)
+        source = HumanoidEnv(headless=True)
+        source.reset()
+        for action in actions[:warmup]:
+            source.step(action)
+        snapshot = source.get_state()
+        for action in actions[warmup:warmup + branch_steps]:
+            source.step(action)
+
+        rollouts = []
+        for env in (source, HumanoidEnv(headless=True)):
+            env.set_state(snapshot)
+            rollouts.append(np.array([env.step(action)[0] for action in actions[warmup + branch_steps:]]))
+        difference = np.abs(rollouts[0] - rollouts[1]).max()
+        if difference > 0:
+            failures.append(f"seed {seed}: restored rollouts differ by up to {difference:.3g}")
+    return failures
+
+def check_main(args):
+    failures = check_snapshot_determinism(args.seeds)
+    if failures:
+        print("Snapshot restores are not deterministic:")
+        for message in failures:
+            print("  " + message)
+        sys.exit(1)
+    print("Snapshot restores are deterministic")
+
+def suite_main(args):
+    max_workers = os.cpu_count() or 1
+    worker_counts = sorted({1, min(args.workers, max_workers), max_workers})
+    results = run_suite(worker_counts, args.steps, args.repeats)
+    report = {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': max_workers,
+            'worker_counts': worker_counts,
+            'steps': args.steps,
+            'repeats': args.repeats,
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = compare(report, baseline, args.tolerance)
+        if failures:
+            print("Performance regressions against " + args.baseline + ":")
+            for message in failures:
+                print("  " + message)
+            sys.exit(1)
+        print("No regressions against " + args.baseline)
+
+def frame_skip_main(args):
+    results = bench_frame_skip(args.frame_skips, args.steps, args.timesteps)
+    print(f"{'frame_skip':>10} {'env steps/s':>12} {'physics steps/s':>16} {'distance (m)':>13} {'train (s)':>10}")
+    for result in results:
+        print(f"{result['frame_skip']:>10} {result['env_steps_per_sec']:>12.0f} {result['physics_steps_per_sec']:>16.0f}"
+              f" {result.get('distance', float('nan')):>13.2f} {result.get('train_time', float('nan')):>10.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the humanoid environment.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite = subparsers.add_parser("suite", help="Throughput suite at 1, N and max workers")
+    suite.add_argument("--workers", type=int, default=4, help="The intermediate worker count N")
+    suite.add_argument("--steps", type=int, default=5000, help="Steps timed per benchmark and process")
+    suite.add_argument("--repeats", type=int, default=3, help="Runs per benchmark, the best one is kept")
+    suite.add_argument("--output", default=None, help="Write the results to this JSON file")
+    suite.add_argument("--baseline", default=None, help="Fail if the results are worse than this JSON file or miss any of its metrics")
+    suite.add_argument("--save-baseline", default=None, help="Store the results as a new baseline JSON file")
+    suite.add_argument("--tolerance", type=float, default=0.15,
+                       help="Relative slowdown allowed before a metric counts as a regression")
+    suite.set_defaults(func=suite_main)
+
+    frame_skip = subparsers.add_parser("frame-skip", help="Compare action repeat settings")
+    frame_skip.add_argument("--frame-skips", type=int, nargs="+", default=[1, 2, 4, 8],
+                            help="Action repeat settings to compare")
+    frame_skip.add_argument("--steps", type=int, default=5000, help="Environment steps timed per setting")
+    frame_skip.add_argument("--timesteps", type=int, default=0,
+                            help="PPO training steps per setting for sample efficiency (0 to skip)")
+    frame_skip.set_defaults(func=frame_skip_main)
+
+    check = subparsers.add_parser("check", help="Check that snapshot restores are deterministic")
+    check.add_argument("--seeds", type=int, default=5, help="Number of random rollouts compared")
+    check.set_defaults(func=check_main)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from concurrency import atomic_write
+from profiling import add_windows, collect_snapshot, summarize
+
+class ProfilerCallback(BaseCallback):
+    """
+    Logs the environment profile next to the PPO scalars after every rollout.
+
+    The values are written under profile/ by the model's logger, so they end up in the
+    same TensorBoard run. The counters of the whole training are kept in self.total.
+    """
+
+    def __init__(self, verbose=0):
+        super(ProfilerCallback, self).__init__(verbose)
+        self.total = None
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        snapshot = collect_snapshot(self.training_env)
+        if snapshot is None:
+            return
+        for key, value in summarize(snapshot).items():
+            self.logger.record(f'profile/{key}', value)
+        self.total = snapshot if self.total is None else add_windows(self.total, snapshot)
+
+class MedianPruningCallback(BaseCallback):
+    """
+    Stops a sweep trial whose rewards fall below the median of the other trials.
+
+    At the end of every rollout the trial reports the mean Monitor reward of its recent
+    episodes for each multiple of `interval` timesteps crossed since the previous rollout, to
+    a JSON file in `directory` where the concurrent trials (each in its own process) read it.
+    Once the policy has been updated `warmup` times, the trial stops if at least `min_trials`
+    other trials reported at the same point and its reward is below their median. Reports
+    are only made between rollouts, so a trial is judged on its updated policy rather than
+    on the noise of a rollout in progress.
+    """
+
+    def __init__(self, directory, trial, interval, warmup=2, min_trials=4, verbose=0):
+        super(MedianPruningCallback, self).__init__(verbose)
+        self.directory = directory
+        self.trial = trial
+        self.interval = interval
+        self.warmup = warmup
+        self.min_trials = min_trials
+        self.reports = {}
+        self.rollouts = 0
+        self.pruned = False
+
+    def _on_step(self):
+        # Stopping takes effect at the first step of the rollout after the pruning decision
+        return not self.pruned
+
+    def _on_rollout_end(self):
+        # The rollout was collected by the policy after this many updates
+        updates = self.rollouts
+        self.rollouts += 1
+        episodes = self.model.ep_info_buffer
+        index = self.num_timesteps // self.interval
+        if not episodes or index == 0:
+            return
+        reward = float(np.mean([episode['r'] for episode in episodes]))
+        # Every point crossed since the previous report gets the current reward, so trials
+        # with different rollout lengths report at the same points
+        first = max(self.reports) + 1 if self.reports else 1
+        if first > index:
+            return
+        for crossed in range(first, index + 1):
+            self.reports[crossed] = reward
+        self._write_reports()
+
+        if updates < self.warmup:
+            return
+        others = [reports[str(index)] for reports in self._read_other_reports() if str(index) in reports]
+        if len(others) >= self.min_trials and reward < np.median(others):
+            self.pruned = True
+            if self.verbose:
+                print(f"Trial {self.trial} pruned at {self.num_timesteps} timesteps after {updates} updates: "
+                      f"reward {reward:.1f} < median {np.median(others):.1f}")
+
+    def _path(self, trial):
+        return os.path.join(self.directory, f"trial_{trial:03d}.json")
+
+    def _write_reports(self):
+        reports = {str(index): reward for index, reward in self.reports.items()}
+
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(reports, f)
+
+        # The other trials read the reports while this one runs
+        atomic_write(self._path(self.trial), write)
+
+    def _read_other_reports(self):
+        own = os.path.basename(self._path(self.trial))
+        for name in os.listdir(self.directory):
+            if name.startswith("trial_") and name.endswith(".json") and name != own:
+                with open(os.path.join(self.directory, name)) as f:
+                    yield json.load(f)
@@ -0,0 +1,34 @@
+import multiprocessing as mp
+import os
+
+def atomic_write(path, write, suffix=""):
+    """
+    Write a file under a temporary name, then move it into place.
+
+    Readers in other processes never see a partial file: os.replace swaps the whole file at
+    once, and a failed write leaves the previous one (if any) untouched.
+
+    Args:
+        path (str): The file to write.
+        write (callable): Called with the temporary path, writes the file there.
+        suffix (str): Ending of the temporary name, for writers that add one when it is
+            missing (e.g. ".npz" for np.savez).
+    """
+    temporary_path = f"{path}.{os.getpid()}{suffix}"
+    try:
+        write(temporary_path)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+def default_start_method():
+    """
+    Get the multiprocessing start method for worker processes.
+
+    Returns:
+        str: 'forkserver' where available, since fork is unsafe once torch has started its
+        threads, 'spawn' otherwise.
+    """
+    return 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
@@ -0,0 +1,66 @@
+import Box2D
+import numpy as np
+from humanoid import BODY_PART_NAMES
+
+# Extra observation channels: whether each body part touches the ground (or a wall or an
+# obstacle), then the normal impulse it received since the previous observation
+CONTACT_KEYS = tuple([f'{part}_contact' for part in BODY_PART_NAMES] +
+                     [f'{part}_impulse' for part in BODY_PART_NAMES])
+CONTACT_SIZE = len(CONTACT_KEYS)
+
+class ContactSensor(Box2D.b2ContactListener):
+    """
+    Contact listener keeping per body part contact counts and normal impulses.
+
+    The humanoid's fixtures are tagged with the index of their body part in BODY_PART_NAMES.
+    Their collision filters only let them touch the static scenery (category 0x0001 and
+    mask 0x0001), so every contact involving a tagged fixture is a ground, wall or obstacle
+    contact. Box2D calls the listener during world.Step, so the arrays are up to date when
+    the step returns and reading them needs no pass over the bodies.
+    """
+
+    def __init__(self, humanoid):
+        super(ContactSensor, self).__init__()
+        for index, name in enumerate(BODY_PART_NAMES):
+            for fixture in getattr(humanoid, name).fixtures:
+                fixture.userData = index
+        self.counts = np.zeros(len(BODY_PART_NAMES), dtype=np.int32)
+        self.impulses = np.zeros(len(BODY_PART_NAMES), dtype=np.float32)
+
+    def BeginContact(self, contact):
+        for fixture in (contact.fixtureA, contact.fixtureB):
+            index = fixture.userData
+            if index is not None:
+                self.counts[index] += 1
+
+    def EndContact(self, contact):
+        for fixture in (contact.fixtureA, contact.fixtureB):
+            index = fixture.userData
+            if index is not None:
+                # Never below zero, even if a contact ends that began before the sensor existed
+                self.counts[index] = max(self.counts[index] - 1, 0)
+
+    def PostSolve(self, contact, impulse):
+        normal_impulse = sum(impulse.normalImpulses[:contact.manifold.pointCount])
+        for fixture in (contact.fixtureA, contact.fixtureB):
+            index = fixture.userData
+            if index is not None:
+                self.impulses[index] += normal_impulse
+
+    def clear(self):
+        """Forget every contact, e.g. after the humanoid was reset."""
+        self.counts[:] = 0
+        self.impulses[:] = 0.0
+
+    def read(self, out):
+        """
+        Write the contact channels, laid out as CONTACT_KEYS, into a float32 buffer and
+        start accumulating the impulses again.
+        Returns:
+            np.array: The filled buffer.
+        """
+        parts = len(BODY_PART_NAMES)
+        out[:parts] = self.counts > 0
+        out[parts:] = self.impulses
+        self.impulses[:] = 0.0
+        return out
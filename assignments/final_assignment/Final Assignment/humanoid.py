@@ -1,7 +1,22 @@
 import Box2D
-from Box2D.b2 import (world, polygonShape, staticBody, dynamicBody, revoluteJointDef)
+from Box2D.b2 import (world, staticBody, dynamicBody)
 import pygame
+import numpy as np
 import math
+from morphology import get_template
+
+# Layout of the state vector filled by Humanoid.read_state(): the angle and motor speed of
+# each joint (left hip, left knee, right hip, right knee), then the position and linear
+# velocity of the torso, thighs and shins.
+BODY_PART_NAMES = ('torso', 'left_thigh', 'right_thigh', 'left_shin', 'right_shin')
+STATE_KEYS = tuple([f'joint_{i}_{name}' for i in range(4) for name in ('angle', 'velocity')] +
+                   [f'{part}_{name}' for part in BODY_PART_NAMES for name in ('x', 'y', 'vx', 'vy')])
+STATE_INDEX = {key: i for i, key in enumerate(STATE_KEYS)}
+STATE_SIZE = len(STATE_KEYS)
+
+# Length of the float32 snapshots of Humanoid.get_state(): 7 values per body part and a
+# motor speed per joint
+SNAPSHOT_SIZE = len(BODY_PART_NAMES) * 7 + 4
 
 def map_image_to_rect(image, vertices, screen):
     """
@@ -20,122 +35,196 @@ def map_image_to_rect(image, vertices, screen):
     rotated_rect = rotated_image.get_rect(center=(center_x, center_y))
     screen.blit(rotated_image, rotated_rect)
 
+# Scaled sprites shared by every Humanoid in the process, keyed by (path, size)
+_image_cache = {}
+
+def load_image(path, size):
+    """
+    Load an image and scale it to the given size, reusing previously loaded copies.
+    """
+    key = (path, size)
+    if key not in _image_cache:
+        _image_cache[key] = pygame.transform.scale(pygame.image.load(path), size)
+    return _image_cache[key]
+
 class Humanoid:
-    def __init__(self, world, x, y):
+    def __init__(self, world, x, y, morphology=None):
         self.world = world
 
-        # Body part dimensions (in meters, Box2D uses meters)
-        self.thigh_length = 0.5
-        self.shin_length = 0.5
-        self.torso_height = 1.0
-        self.torso_width = 0.3
-        self.leg_width = 0.2
-
-        # Define collision categories for body parts
-        self.category_torso = 0x0001  # Torso category
-        self.category_left_leg = 0x0002  # Left leg category
-        self.category_right_leg = 0x0004  # Right leg category
-
-        # Define mask for collision categories (what the body can collide with)
-        self.mask_ground_walls = 0x0001  # Collide with ground and walls
-        self.mask_no_self = 0xFFFF ^ (self.category_left_leg | self.category_right_leg)  # Avoid colliding with own parts
-
-        # Create torso with collision filtering
-        self.torso = self.world.CreateDynamicBody(position=(x, y),
-                                                  fixtures=Box2D.b2FixtureDef(
-                                                      shape=polygonShape(box=(self.torso_width / 2, self.torso_height / 2)),
-                                                      density=1.0,
-                                                      filter=Box2D.b2Filter(categoryBits=self.category_torso, maskBits=self.mask_ground_walls)))
-
-        # Load torso image
-        self.torso.image = pygame.image.load('./assets/torso.png')
-        self.torso.image = pygame.transform.scale(self.torso.image, (int(self.torso_width * 100), int(self.torso_height * 100)))
-
-        # Create left thigh with collision filtering
-        self.left_thigh = self.world.CreateDynamicBody(position=(x - 0.15, y - self.torso_height / 2 - self.thigh_length / 2),
-                                                       fixtures=Box2D.b2FixtureDef(
-                                                           shape=polygonShape(box=(self.leg_width / 2, self.thigh_length / 2)),
-                                                           density=1.0,
-                                                           filter=Box2D.b2Filter(categoryBits=self.category_left_leg, maskBits=self.mask_ground_walls)))
-
-        # Load left thigh image
-        self.left_thigh.image = pygame.image.load('./assets/left_thigh.png')
-        self.left_thigh.image = pygame.transform.scale(self.left_thigh.image, (int(self.leg_width * 100), int(self.thigh_length * 100)))
-
-        # Create left shin with collision filtering
-        self.left_shin = self.world.CreateDynamicBody(position=(x - 0.15, y - self.torso_height / 2 - self.thigh_length - self.shin_length / 2),
-                                                    fixtures=Box2D.b2FixtureDef(
-                                                        shape=polygonShape(box=(self.leg_width / 2, self.shin_length / 2)),
-                                                        density=1.0,
-                                                        filter=Box2D.b2Filter(categoryBits=self.category_left_leg, maskBits=self.mask_ground_walls)))
-
-        # Load left shin image
-        self.left_shin.image = pygame.image.load('./assets/left_shin.png')
-        self.left_shin.image = pygame.transform.scale(self.left_shin.image, (int(self.leg_width * 100), int(self.shin_length * 100)))
-
-        # Create right thigh with collision filtering
-        self.right_thigh = self.world.CreateDynamicBody(position=(x + 0.15, y - self.torso_height / 2 - self.thigh_length / 2),
-                                                        fixtures=Box2D.b2FixtureDef(
-                                                            shape=polygonShape(box=(self.leg_width / 2, self.thigh_length / 2)),
-                                                            density=1.0,
-                                                            filter=Box2D.b2Filter(categoryBits=self.category_right_leg, maskBits=self.mask_ground_walls)))
-
-        # Load right thigh image
-        self.right_thigh.image = pygame.image.load('./assets/right_thigh.png')
-        self.right_thigh.image = pygame.transform.scale(self.right_thigh.image, (int(self.leg_width * 100), int(self.thigh_length * 100)))
-
-        # Create right shin with collision filtering
-        self.right_shin = self.world.CreateDynamicBody(position=(x + 0.15, y - self.torso_height / 2 - self.thigh_length - self.shin_length / 2),
-                                                    fixtures=Box2D.b2FixtureDef(
-                                                        shape=polygonShape(box=(self.leg_width / 2, self.shin_length / 2)),
-                                                        density=1.0,
-                                                        filter=Box2D.b2Filter(categoryBits=self.category_right_leg, maskBits=self.mask_ground_walls)))
-
-        # Load right shin image
-        self.right_shin.image = pygame.image.load('./assets/right_shin.png')
-        self.right_shin.image = pygame.transform.scale(self.right_shin.image, (int(self.leg_width * 100), int(self.shin_length * 100)))
-
-        # Create joints (same as before)
+        # Body part dimensions, densities, joints and collision filters come from the
+        # morphology spec, compiled once per spec (see morphology.py)
+        self.template = get_template(morphology)
+        names = [limb[0] for limb in self.template.limbs]
+        if sorted(names) != sorted(BODY_PART_NAMES) or len(self.template.joints) != 4:
+            raise ValueError(f"A humanoid morphology needs the limbs {BODY_PART_NAMES} and 4 joints")
+
+        # Create the body parts at their offsets from (x, y), as self.torso, self.left_thigh, ...
+        self.bodies = []
+        for name, offset, body_def, fixture_def, _, _ in self.template.limbs:
+            body_def.position = (x + offset[0], y + offset[1])
+            body = self.world.CreateBody(body_def)
+            body.CreateFixture(fixture_def)
+            setattr(self, name, body)
+            self.bodies.append(body)
+
+        # Images are only loaded once the humanoid is rendered (see load_images)
+        self.images_loaded = False
+
+        # Create joints
         self.joints = []
+        self.joint_defs = []
         self.create_joints()
 
+        # Preallocated state buffer, refreshed by read_state()
+        self.state = np.zeros(STATE_SIZE, dtype=np.float32)
+
+        # Snapshot of the freshly built humanoid, restored by reset()
+        self.initial_state = self.save_state()
+
+    def _limb(self, name):
+        """Get the spec of a body part from the morphology."""
+        return next(limb for limb in self.template.spec['limbs'] if limb['name'] == name)
+
+    # Dimensions (in meters) and collision filters of the body parts, read from the morphology.
+    # The legs are described by the left ones.
+    @property
+    def thigh_length(self):
+        return self._limb('left_thigh')['size'][1]
+
+    @property
+    def shin_length(self):
+        return self._limb('left_shin')['size'][1]
+
+    @property
+    def torso_height(self):
+        return self._limb('torso')['size'][1]
+
+    @property
+    def torso_width(self):
+        return self._limb('torso')['size'][0]
+
+    @property
+    def leg_width(self):
+        return self._limb('left_thigh')['size'][0]
+
+    @property
+    def category_torso(self):
+        return self._limb('torso')['category']
+
+    @property
+    def category_left_leg(self):
+        return self._limb('left_thigh')['category']
+
+    @property
+    def category_right_leg(self):
+        return self._limb('right_thigh')['category']
+
+    @property
+    def mask_ground_walls(self):
+        return self._limb('torso')['mask']
+
+    @property
+    def mask_no_self(self):
+        return 0xFFFF ^ (self.category_left_leg | self.category_right_leg)
+
+    def sprites(self):
+        """
+        List the image drawn for each body part.
+        Returns:
+            list: (body, image path, size in pixels) tuples.
+        """
+        return [(body, path, size) for body, (_, _, _, _, path, size) in zip(self.bodies, self.template.limbs)]
+
+    def load_images(self):
+        """Load and scale the body part images used for rendering."""
+        if self.images_loaded:
+            return
+        for body, path, size in self.sprites():
+            body.image = load_image(path, size)
+        self.images_loaded = True
+
     def create_joints(self):
-        """Create the joints between the body parts."""
-        # Left hip joint
-        joint = revoluteJointDef(bodyA=self.torso,
-                                 bodyB=self.left_thigh,
-                                 localAnchorA=(-0.15, -self.torso_height / 2),
-                                 localAnchorB=(0, self.thigh_length / 2),
-                                 enableMotor=True,
-                                 maxMotorTorque=40.0)
-        self.joints.append(self.world.CreateJoint(joint))
-
-        # Left knee joint
-        joint = revoluteJointDef(bodyA=self.left_thigh,
-                                 bodyB=self.left_shin,
-                                 localAnchorA=(0, -self.thigh_length / 2),
-                                 localAnchorB=(0, self.shin_length / 2),
-                                 enableMotor=True,
-                                 maxMotorTorque=40.0)
-        self.joints.append(self.world.CreateJoint(joint))
-
-        # Right hip joint
-        joint = revoluteJointDef(bodyA=self.torso,
-                                 bodyB=self.right_thigh,
-                                 localAnchorA=(0.15, -self.torso_height / 2),
-                                 localAnchorB=(0, self.thigh_length / 2),
-                                 enableMotor=True,
-                                 maxMotorTorque=40.0)
-        self.joints.append(self.world.CreateJoint(joint))
-
-        # Right knee joint
-        joint = revoluteJointDef(bodyA=self.right_thigh,
-                                 bodyB=self.right_shin,
-                                 localAnchorA=(0, -self.thigh_length / 2),
-                                 localAnchorB=(0, self.shin_length / 2),
-                                 enableMotor=True,
-                                 maxMotorTorque=40.0)
-        self.joints.append(self.world.CreateJoint(joint))
+        """Create the joints between the body parts, keeping their definitions for restore_state()."""
+        for _, index_a, index_b, parameters in self.template.joints:
+            # Setting the fields directly skips the slower keyword handling of revoluteJointDef()
+            joint = Box2D.b2RevoluteJointDef()
+            joint.bodyA = self.bodies[index_a]
+            joint.bodyB = self.bodies[index_b]
+            for name, value in parameters.items():
+                setattr(joint, name, value)
+            self.joint_defs.append(joint)
+            self.joints.append(self.world.CreateJoint(joint))
+
+    def save_state(self):
+        """
+        Capture the kinematic state of every body part.
+        Returns:
+            list: One (position, angle, linear velocity, angular velocity, awake) tuple per body.
+        """
+        return [(tuple(body.position), body.angle, tuple(body.linearVelocity), body.angularVelocity, body.awake)
+                for body in self.bodies]
+
+    def restore_state(self, state):
+        """
+        Put the body parts back to a state captured by save_state() and rebuild the joints
+        with zero motor speeds.
+        """
+        # Deactivating a body destroys its contacts, with their warm starting impulses, and its
+        # broad-phase proxies, so the contacts are found again from scratch on the next step
+        for body in self.bodies:
+            body.active = False
+        for body, (position, angle, linear_velocity, angular_velocity, awake) in zip(self.bodies, state):
+            # Going to sleep clears the velocities, forces and sleep timer of the body
+            body.awake = False
+            body.transform = (position, angle)
+            body.awake = True
+            body.linearVelocity = linear_velocity
+            body.angularVelocity = angular_velocity
+            body.awake = awake
+        for body in self.bodies:
+            body.active = True
+        # Reactivating does not flag the new proxies like a freshly built world does, so find
+        # their contacts now rather than at the end of the next step; otherwise the rollout
+        # would depend on whether this world had been stepped before
+        self.world.contactManager.FindNewContacts()
+
+        # Box2D keeps the warm starting impulses of a joint internally, so the joints are
+        # recreated from their definitions rather than reused
+        for joint in self.joints:
+            self.world.DestroyJoint(joint)
+        self.joints = [self.world.CreateJoint(joint) for joint in self.joint_defs]
+
+    def get_state(self):
+        """
+        Capture the humanoid as a compact binary snapshot.
+
+        Joint angles follow from the body transforms. Box2D does not expose the sleep timers
+        and solver warm starting impulses, which set_state() clears instead.
+        Returns:
+            bytes: SNAPSHOT_SIZE float32 values, (x, y, angle, vx, vy, angular velocity, awake)
+            per body followed by the joint motor speeds.
+        """
+        snapshot = np.empty(SNAPSHOT_SIZE, dtype=np.float32)
+        bodies = snapshot[:len(self.bodies) * 7].reshape(-1, 7)
+        for row, body in zip(bodies, self.bodies):
+            position, velocity = body.position, body.linearVelocity
+            row[:] = (position.x, position.y, body.angle, velocity.x, velocity.y, body.angularVelocity, body.awake)
+        snapshot[len(self.bodies) * 7:] = [joint.motorSpeed for joint in self.joints]
+        return snapshot.tobytes()
+
+    def set_state(self, snapshot):
+        """
+        Restore a snapshot taken by get_state(), on this humanoid or another one built the same way.
+        """
+        values = np.frombuffer(snapshot, dtype=np.float32).tolist()
+        self.restore_state([((x, y), angle, (vx, vy), angular_velocity, bool(awake))
+                            for x, y, angle, vx, vy, angular_velocity, awake
+                            in zip(*[iter(values[:len(self.bodies) * 7])] * 7)])
+        self.update_motors(values[len(self.bodies) * 7:])
+
+    def reset(self):
+        """Restore the humanoid to the state it was created in."""
+        self.restore_state(self.initial_state)
 
     def update_motors(self, motor_speeds):
         """
@@ -146,52 +235,43 @@ class Humanoid:
 
     def render(self, screen, ppm):
         """Render the humanoid on the screen."""
-        for body in [self.torso, self.left_thigh, self.left_shin, self.right_thigh, self.right_shin]:
+        self.load_images()
+        for body in self.bodies:
             for fixture in body.fixtures:
                 shape = fixture.shape
                 vertices = [(body.transform * v) * ppm for v in shape.vertices]
                 vertices = [(v[0], 600 - v[1]) for v in vertices]  # Flip y-axis for rendering
                 map_image_to_rect(body.image, vertices, screen)
 
+    def read_state(self, out=None):
+        """
+        Write the current state into a float32 buffer laid out as STATE_KEYS.
+        Args:
+            out (np.array, optional): Buffer to fill, defaults to self.state.
+        Returns:
+            np.array: The filled buffer, overwritten by the next call.
+        """
+        if out is None:
+            out = self.state
+        hip_l, knee_l, hip_r, knee_r = self.joints
+        torso_p, torso_v = self.torso.position, self.torso.linearVelocity
+        left_thigh_p, left_thigh_v = self.left_thigh.position, self.left_thigh.linearVelocity
+        right_thigh_p, right_thigh_v = self.right_thigh.position, self.right_thigh.linearVelocity
+        left_shin_p, left_shin_v = self.left_shin.position, self.left_shin.linearVelocity
+        right_shin_p, right_shin_v = self.right_shin.position, self.right_shin.linearVelocity
+        out[:] = (hip_l.angle, hip_l.motorSpeed, knee_l.angle, knee_l.motorSpeed,
+                  hip_r.angle, hip_r.motorSpeed, knee_r.angle, knee_r.motorSpeed,
+                  torso_p.x, torso_p.y, torso_v.x, torso_v.y,
+                  left_thigh_p.x, left_thigh_p.y, left_thigh_v.x, left_thigh_v.y,
+                  right_thigh_p.x, right_thigh_p.y, right_thigh_v.x, right_thigh_v.y,
+                  left_shin_p.x, left_shin_p.y, left_shin_v.x, left_shin_v.y,
+                  right_shin_p.x, right_shin_p.y, right_shin_v.x, right_shin_v.y)
+        return out
+
     def log_state(self):
         """
         Logs the relevant state information.
         Returns:
-            dict: Contains the state values (joint angles, positions, velocities, etc.).
-        """
-        state = {}
-        for i, joint in enumerate(self.joints):
-            joint_angle = joint.angle
-            joint_velocity = joint.motorSpeed
-            state[f'joint_{i}_angle'] = joint_angle
-            state[f'joint_{i}_velocity'] = joint_velocity
-
-        # Position and velocities of the torso and limbs
-        state['torso_x'] = self.torso.position.x
-        state['torso_y'] = self.torso.position.y
-        state['torso_vx'] = self.torso.linearVelocity.x
-        state['torso_vy'] = self.torso.linearVelocity.y
-
-        # Left and right thighs, shins positions and velocities
-        state['left_thigh_x'] = self.left_thigh.position.x
-        state['left_thigh_y'] = self.left_thigh.position.y
-        state['left_thigh_vx'] = self.left_thigh.linearVelocity.x
-        state['left_thigh_vy'] = self.left_thigh.linearVelocity.y
-
-        state['right_thigh_x'] = self.right_thigh.position.x
-        state['right_thigh_y'] = self.right_thigh.position.y
-        state['right_thigh_vx'] = self.right_thigh.linearVelocity.x
-        state['right_thigh_vy'] = self.right_thigh.linearVelocity.y
-
-        # Left and right shins positions and velocities
-        state['left_shin_x'] = self.left_shin.position.x
-        state['left_shin_y'] = self.left_shin.position.y
-        state['left_shin_vx'] = self.left_shin.linearVelocity.x
-        state['left_shin_vy'] = self.left_shin.linearVelocity.y
-
-        state['right_shin_x'] = self.right_shin.position.x
-        state['right_shin_y'] = self.right_shin.position.y
-        state['right_shin_vx'] = self.right_shin.linearVelocity.x
-        state['right_shin_vy'] = self.right_shin.linearVelocity.y
-
-        return state
+            dict: Contains the state values (joint angles, positions, velocities, etc.), keyed by STATE_KEYS.
+        """
+        return dict(zip(STATE_KEYS, self.read_state().tolist()))
@@ -2,19 +2,109 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import pygame
+import time
 from simulation import Simulation
+from profiling import StepProfiler
+from humanoid import STATE_INDEX, STATE_SIZE
+from contacts import CONTACT_SIZE
+
+# Actions in [-1, 1] are scaled by this to get the joint motor speeds
+MAX_MOTOR_SPEED = 10  # Adjust based on the motor's actual speed limits
+
+# Reward parameters, each can be overridden through HumanoidEnv(reward_coefs=...)
+DEFAULT_REWARD_COEFS = {
+    'straight_coef': 5000,
+    'forward_coef': 10,
+    'velocity_coef': 100,
+    'done_bonus': 10000,
+}
+
+# The episode ends once the torso passes this x position
+GOAL_X = 14.5
+
+# State indices read by the reward, the limb velocities in the order they are summed
+TORSO_X, TORSO_Y, TORSO_VX = STATE_INDEX['torso_x'], STATE_INDEX['torso_y'], STATE_INDEX['torso_vx']
+LIMB_VX = [STATE_INDEX[key] for key in ('left_thigh_vx', 'right_thigh_vx', 'right_shin_vx', 'left_shin_vx')]
+
+def compute_rewards(states, straight_coef=DEFAULT_REWARD_COEFS['straight_coef'],
+                    forward_coef=DEFAULT_REWARD_COEFS['forward_coef'],
+                    velocity_coef=DEFAULT_REWARD_COEFS['velocity_coef'],
+                    done_bonus=DEFAULT_REWARD_COEFS['done_bonus']):
+    """
+    Compute the rewards for a batch of humanoid states.
+
+    Args:
+        states (np.array): States laid out as humanoid.STATE_KEYS, of shape (N, STATE_SIZE)
+            or (STATE_SIZE,) for a single one.
+        straight_coef, forward_coef, velocity_coef, done_bonus (float): Reward parameters,
+            defaulting to DEFAULT_REWARD_COEFS.
+
+    Returns:
+        np.array: float64 rewards of shape (N,), or a scalar for a single state.
+    """
+    # Work on the transpose so that columns index the same way for one or many states
+    columns = np.asarray(states, dtype=np.float64).T
+    x = columns[TORSO_X]
+
+    # Positivity function for velocity
+    limb_vx = columns[LIMB_VX]
+    pos = np.where(limb_vx > 0, limb_vx, -1.0)
+
+    # Compute reward
+    rewards = ((columns[TORSO_Y] - 1.7) * straight_coef +
+               (x - 2) * forward_coef +
+               (pos[0] + pos[1] + pos[2] + pos[3] + columns[TORSO_VX]) * velocity_coef)
+
+    # Bonus for completing the task
+    return rewards + (x > GOAL_X) * done_bonus
+
+def compute_dones(states):
+    """
+    Determine which episodes are done for a batch of humanoid states.
+
+    Returns:
+        np.array: True where the humanoid reached the goal, shaped like compute_rewards().
+    """
+    # End the episode if the humanoid reaches the goal
+    return np.asarray(states).T[TORSO_X] > GOAL_X
 
 class HumanoidEnv(gym.Env):
     """
     Custom OpenAI Gym environment for controlling a humanoid's walk.
     """
 
-    def __init__(self):
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
+
+    def __init__(self, headless=False, frame_skip=1, time_step=1.0 / 60.0, velocity_iterations=6, position_iterations=2,
+                 render_mode=None, render_scale=1.0, reward_coefs=None, profile=False, terrain=None,
+                 contact_observations=False, morphology=None):
         super(HumanoidEnv, self).__init__()
 
-        # Initialize the simulation
-        self.simulation = Simulation()
-        self.simulation_clock = pygame.time.Clock()
+        # Per phase timings of the steps, only collected when profiling
+        self.profiler = StepProfiler() if profile else None
+
+        # Reward parameters, overriding DEFAULT_REWARD_COEFS
+        self.reward_coefs = dict(DEFAULT_REWARD_COEFS, **(reward_coefs or {}))
+
+        # "human" draws to a window, "rgb_array" draws offscreen frames (render_scale shrinks them)
+        if render_mode is not None and render_mode not in self.metadata["render_modes"]:
+            raise ValueError(f"Unsupported render mode: {render_mode}")
+        self.render_mode = render_mode
+        self.render_scale = render_scale
+
+        if frame_skip < 1:
+            raise ValueError(f"frame_skip must be at least 1, got {frame_skip}")
+        # Each action is repeated for frame_skip physics steps
+        self.frame_skip = frame_skip
+
+        # Initialize the simulation (a headless one never opens a window)
+        self.headless = headless
+        self.simulation = Simulation(headless=headless, time_step=time_step,
+                                     velocity_iterations=velocity_iterations,
+                                     position_iterations=position_iterations,
+                                     terrain=terrain, contacts=contact_observations,
+                                     morphology=morphology)
+        self.simulation_clock = None
 
         # Define the action space: motor speeds for 4 joints (normalized to [-1, 1])
         self.action_space = spaces.Box(
@@ -23,67 +113,155 @@ class HumanoidEnv(gym.Env):
             dtype=np.float32
         )
 
-        # Define the observation space based on the humanoid's log_state
+        # Define the observation space based on the humanoid's log_state, followed by the
+        # contacts.CONTACT_KEYS channels when contact_observations is set
         self.observation_space = spaces.Box(
             low=-np.inf,
             high=np.inf,
-            shape=(len(self.simulation.humanoid.log_state()),),
+            shape=(STATE_SIZE + (CONTACT_SIZE if contact_observations else 0),),
             dtype=np.float32
         )
 
     def reset(self, seed=None, options=None):
         """
         Reset the environment to its initial state and return the initial observation.
+
+        Args:
+            options (dict, optional): {"terrain": terrain.Terrain or None} switches the ground
+                (e.g. to get_terrain(seed) for a curriculum); otherwise the terrain is kept.
         """
-        del self.simulation  # Clear the previous simulation
-        self.simulation = Simulation()  # Restart the simulation
+        if self.profiler is not None:
+            self.profiler.resets += 1
+
+        if options and 'terrain' in options:
+            self.simulation.set_terrain(options['terrain'])
+
+        # Restore the humanoid in place, which matches a freshly built Simulation exactly
+        self.simulation.reset()
+        self.simulation.humanoid.read_state()
         return self._get_observation(), {}
 
+    def get_state(self):
+        """
+        Snapshot the simulator, e.g. to branch several rollouts from the same point.
+
+        Returns:
+            bytes: The snapshot, see Humanoid.get_state().
+        """
+        return self.simulation.get_state()
+
+    def set_state(self, snapshot):
+        """
+        Restore a snapshot taken by get_state(), from this environment or another one.
+
+        Returns:
+            np.array: The observation of the restored state.
+        """
+        self.simulation.set_state(snapshot)
+        self.simulation.humanoid.read_state()
+        return self._get_observation()
+
     def step(self, action):
         """
-        Perform one step in the environment with the given action.
+        Perform one step in the environment with the given action, repeated for frame_skip physics steps.
 
         Args:
             action (np.array): Normalized motor speeds for the joints.
 
         Returns:
             observation (np.array): The new observation.
-            reward (float): The computed reward.
+            reward (float): The reward summed over the physics steps.
             done (bool): Whether the episode is finished.
             info (dict): Additional debug information.
         """
+        if self.profiler is not None:
+            return self._profiled_step(action)
+
         # Scale the action back to the motor speed range
-        max_motor_speed = 10  # Adjust based on the motor's actual speed limits
-        scaled_action = action * max_motor_speed
-        self.simulation.humanoid.update_motors(scaled_action)
+        scaled_action = action * MAX_MOTOR_SPEED
 
-        # Step the simulation forward
-        self.simulation.world.Step(1.0 / 60.0, 6, 2)
+        # Repeat the action for frame_skip physics steps, accumulating the reward
+        # and stopping as soon as the episode is over
+        reward = 0.0
+        for _ in range(self.frame_skip):
+            # Step the simulation forward
+            self.simulation.step(scaled_action)
 
-        # Get the new observation
-        observation = self._get_observation()
+            # Read the state once, it is shared by the reward and termination below
+            self.simulation.humanoid.read_state()
 
-        # Compute the reward
-        reward = self._compute_reward()
+            # Compute the reward
+            reward += self._compute_reward()
 
-        # Check if the episode is done
-        done = self._is_done()
+            # Check if the episode is done
+            done = self._is_done()
+            if done:
+                break
+
+        # Get the new observation
+        observation = self._get_observation()
 
         # Additional info (can include debug data if needed)
         info = {}
 
         return observation, reward, done, False, info
 
-    def render(self, mode='human'):
+    def _profiled_step(self, action):
+        """
+        Same as step(), timing each phase into the profiler.
+        """
+        profiler = self.profiler
+        totals = profiler.totals
+        humanoid = self.simulation.humanoid
+        scaled_action = action * MAX_MOTOR_SPEED
+
+        reward = 0.0
+        for _ in range(self.frame_skip):
+            # The same call as step(), which times its motors and physics phases itself
+            self.simulation.step(scaled_action, totals)
+            t2 = time.perf_counter()
+            humanoid.read_state()
+            t3 = time.perf_counter()
+            reward += self._compute_reward()
+            t4 = time.perf_counter()
+            done = self._is_done()
+            t5 = time.perf_counter()
+            totals['state'] += t3 - t2
+            totals['reward'] += t4 - t3
+            totals['done'] += t5 - t4
+            if done:
+                break
+        profiler.steps += 1
+
+        return self._get_observation(), reward, done, False, {}
+
+    def render(self, mode=None):
         """
         Render the environment using the simulation's rendering system.
+
+        Args:
+            mode (str, optional): "human" or "rgb_array", defaults to the env's render_mode
+                (and to "human" when that is not set either).
+
+        Returns:
+            np.array: In "rgb_array" mode, the frame. It is a reused buffer that the next
+            call overwrites, copy it to keep it.
         """
-        self.simulation.screen.fill(self.simulation.bg_color)
-        self.simulation.render_ground()
-        self.simulation.render_flag()
-        self.simulation.humanoid.render(self.simulation.screen, self.simulation.ppm)
-        pygame.display.flip()
-        self.simulation_clock.tick(600)
+        mode = mode or self.render_mode or 'human'
+        start = time.perf_counter() if self.profiler is not None else None
+        if mode == 'rgb_array':
+            frame = self.simulation.render_frame(self.render_scale)
+        else:
+            if self.simulation_clock is None:
+                self.simulation_clock = pygame.time.Clock()
+            self.simulation.render()
+            frame = None
+        if start is not None:
+            self.profiler.totals['render'] += time.perf_counter() - start
+        if mode == 'human':
+            # The frame rate cap is not part of the rendering time
+            self.simulation_clock.tick(600)
+        return frame
 
     def close(self):
         """
@@ -93,48 +271,27 @@ class HumanoidEnv(gym.Env):
 
     def _get_observation(self):
         """
-        Get the current observation from the humanoid's state.
+        Get the current observation from the humanoid's state buffer and the contact sensor.
 
         Returns:
-            np.array: The state as a flattened array.
+            np.array: A copy of the state, so it stays valid after the next step.
         """
-        state = self.simulation.humanoid.log_state()
-        return np.array(list(state.values()), dtype=np.float32)
+        contacts = self.simulation.contacts
+        if contacts is None:
+            return self.simulation.humanoid.state.copy()
+        observation = np.empty(STATE_SIZE + CONTACT_SIZE, dtype=np.float32)
+        observation[:STATE_SIZE] = self.simulation.humanoid.state
+        contacts.read(observation[STATE_SIZE:])
+        return observation
 
     def _compute_reward(self):
         """
-        Compute the reward based on the current state.
+        Compute the reward based on the state read during the current step.
 
         Returns:
             float: The reward value.
         """
-        state = self.simulation.humanoid.log_state()
-        x = state.get('torso_x', 0)
-        y = state.get('torso_y', 0)
-
-        # Reward parameters
-        straight_coef = 5000
-        forward_coef = 10
-        velocity_coef = 100
-        done_bonus = 10000
-
-        # Positivity function for velocity
-        def pos(val):
-            return val if val > 0 else -1
-
-        # Compute reward
-        reward = ((y - 1.7) * straight_coef +
-                  (x - 2) * forward_coef +
-                  (pos(state.get('left_thigh_vx')) +
-                   pos(state.get('right_thigh_vx')) +
-                   pos(state.get('right_shin_vx')) +
-                   pos(state.get('left_shin_vx')) +
-                   state.get('torso_vx')) * velocity_coef)
-
-        if x > 14.5:  # Bonus for completing the task
-            reward += done_bonus
-
-        return reward
+        return float(compute_rewards(self.simulation.humanoid.state, **self.reward_coefs))
 
     def _is_done(self):
         """
@@ -143,8 +300,4 @@ class HumanoidEnv(gym.Env):
         Returns:
             bool: True if the episode is finished, otherwise False.
         """
-        state = self.simulation.humanoid.log_state()
-        x = state.get('torso_x', 0)
-
-        # End the episode if the humanoid reaches the goal
-        return x > 14.5
+        return bool(compute_dones(self.simulation.humanoid.state))
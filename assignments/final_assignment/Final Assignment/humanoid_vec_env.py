@@ -0,0 +1,213 @@
+from gymnasium import spaces
+import numpy as np
+import time
+from stable_baselines3.common.vec_env import VecEnv
+from simulation import Simulation
+from humanoid import STATE_SIZE
+from contacts import CONTACT_SIZE
+from morphology import get_template
+from humanoid_env_rl import DEFAULT_REWARD_COEFS, MAX_MOTOR_SPEED, compute_dones, compute_rewards
+from profiling import StepProfiler
+
+class HumanoidVecEnv(VecEnv):
+    """
+    Batched environment stepping N independent humanoids in a single process.
+
+    Every member is a headless Simulation with its own Box2D world, built and stepped
+    exactly like the one inside HumanoidEnv, so trajectories match the single env.
+    Finished members are reset automatically, following the stable-baselines3 VecEnv API.
+    With max_episode_steps, members are also cut short (truncated) after that many steps,
+    like HumanoidEnv under gymnasium's TimeLimit.
+    """
+
+    def __init__(self, num_envs, frame_skip=1, time_step=1.0 / 60.0, velocity_iterations=6, position_iterations=2,
+                 reward_coefs=None, profile=False, terrain=None, contact_observations=False, morphology=None,
+                 max_episode_steps=None):
+        # Same physics, reward, terrain, observation and morphology settings as HumanoidEnv
+        if frame_skip < 1:
+            raise ValueError(f"frame_skip must be at least 1, got {frame_skip}")
+        self.frame_skip = frame_skip
+        self.contact_observations = contact_observations
+        self.max_episode_steps = max_episode_steps
+        # Timings of whole batches, only collected when profiling
+        self.profiler = StepProfiler() if profile else None
+        self.reward_coefs = dict(DEFAULT_REWARD_COEFS, **(reward_coefs or {}))
+        # Compile the morphology once for all the members
+        morphology = get_template(morphology)
+        self.simulations = [Simulation(headless=True, time_step=time_step,
+                                       velocity_iterations=velocity_iterations,
+                                       position_iterations=position_iterations,
+                                       terrain=terrain, contacts=contact_observations,
+                                       morphology=morphology)
+                            for _ in range(num_envs)]
+        observation_size = STATE_SIZE + (CONTACT_SIZE if contact_observations else 0)
+
+        # Same spaces as HumanoidEnv
+        action_space = spaces.Box(
+            low=np.array([-1, -1, -1, -1]),
+            high=np.array([1, 1, 1, 1]),
+            dtype=np.float32
+        )
+        observation_space = spaces.Box(
+            low=-np.inf,
+            high=np.inf,
+            shape=(observation_size,),
+            dtype=np.float32
+        )
+        super(HumanoidVecEnv, self).__init__(num_envs, observation_space, action_space)
+
+        # Contiguous buffers filled in place on every step
+        self.observations = np.zeros((num_envs, observation_size), dtype=np.float32)
+        # Views of the humanoid states and contact channels inside the observations
+        self.states = self.observations[:, :STATE_SIZE]
+        self.contact_channels = self.observations[:, STATE_SIZE:]
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+        self.actions = None
+
+    def reset(self):
+        """
+        Reset every humanoid and return the initial observations.
+
+        Returns:
+            np.array: Observations of shape (num_envs, observation size).
+        """
+        for i, simulation in enumerate(self.simulations):
+            simulation.reset()
+            self._read_observation(i)
+        self.episode_steps[:] = 0
+        if self.profiler is not None:
+            self.profiler.resets += self.num_envs
+        # The humanoids are deterministic, seeds and options have nothing to act on
+        self._reset_seeds()
+        self._reset_options()
+        return self.observations.copy()
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        """
+        Step every humanoid with the actions given to step_async().
+
+        Returns:
+            observations (np.array): (num_envs, observation size) observations, reset ones for finished members.
+            rewards (np.array): (num_envs,) rewards.
+            dones (np.array): (num_envs,) episode end flags.
+            infos (list): One dict per member, with the terminal observation of finished ones
+                and whether they were truncated.
+        """
+        # Scale all the actions back to motor speeds at once
+        motor_speeds = np.asarray(self.actions) * MAX_MOTOR_SPEED
+        infos = [{} for _ in range(self.num_envs)]
+
+        # Repeat the actions for frame_skip physics steps like HumanoidEnv.step, with the
+        # reward and termination of all the still running members computed in one go
+        profiler = self.profiler
+        rewards = np.zeros(self.num_envs)
+        self.dones[:] = False
+        running = np.arange(self.num_envs)
+        for _ in range(self.frame_skip):
+            if profiler is None:
+                for i in running:
+                    simulation = self.simulations[i]
+                    simulation.step(motor_speeds[i])
+                    simulation.humanoid.read_state(out=self.states[i])
+                states = self.observations[running]
+                rewards[running] += compute_rewards(states, **self.reward_coefs)
+                dones = compute_dones(states)
+            else:
+                dones = self._profiled_advance(running, motor_speeds, rewards)
+            self.dones[running] = dones
+            running = running[~dones]
+            if len(running) == 0:
+                break
+        self.rewards[:] = rewards
+        self.episode_steps += 1
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_episode_steps is not None:
+            truncated = ~self.dones & (self.episode_steps >= self.max_episode_steps)
+            self.dones |= truncated
+
+        # The contact channels cover the whole step, so they are read once after the substeps
+        if self.contact_observations:
+            for i, simulation in enumerate(self.simulations):
+                simulation.contacts.read(self.contact_channels[i])
+
+        if profiler is not None:
+            profiler.steps += self.num_envs
+            profiler.resets += int(self.dones.sum())
+
+        for i in np.flatnonzero(self.dones):
+            infos[i]['terminal_observation'] = self.observations[i].copy()
+            infos[i]['TimeLimit.truncated'] = bool(truncated[i])
+            self.simulations[i].reset()
+            self._read_observation(i)
+            self.episode_steps[i] = 0
+
+        return self.observations.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def _profiled_advance(self, running, motor_speeds, rewards):
+        """
+        One physics step of the running members, phase by phase, timed into the profiler.
+
+        Returns:
+            np.array: The done flags of the running members.
+        """
+        totals = self.profiler.totals
+        for i in running:
+            # The same call as the unprofiled path, which times its motors and physics phases itself
+            self.simulations[i].step(motor_speeds[i], totals)
+        t2 = time.perf_counter()
+        for i in running:
+            self.simulations[i].humanoid.read_state(out=self.states[i])
+        states = self.observations[running]
+        t3 = time.perf_counter()
+        rewards[running] += compute_rewards(states, **self.reward_coefs)
+        t4 = time.perf_counter()
+        dones = compute_dones(states)
+        t5 = time.perf_counter()
+        totals['state'] += t3 - t2
+        totals['reward'] += t4 - t3
+        totals['done'] += t5 - t4
+        return dones
+
+    def _read_observation(self, i):
+        """Fill the observation row of member i from its humanoid and contact sensor."""
+        simulation = self.simulations[i]
+        simulation.humanoid.read_state(out=self.states[i])
+        if simulation.contacts is not None:
+            simulation.contacts.read(self.contact_channels[i])
+
+    def profile_snapshots(self):
+        """
+        Get the profiler counters and start a new window.
+
+        Returns:
+            list: The snapshot of this batch, empty when profiling is disabled.
+        """
+        return [] if self.profiler is None else [self.profiler.snapshot()]
+
+    def close(self):
+        self.simulations = []
+
+    def get_attr(self, attr_name, indices=None):
+        """Return an attribute of the member simulations."""
+        if attr_name == 'render_mode':
+            # Members are headless and never render
+            return [None for _ in self._get_indices(indices)]
+        return [getattr(self.simulations[i], attr_name) for i in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        """Set an attribute on the member simulations."""
+        for i in self._get_indices(indices):
+            setattr(self.simulations[i], attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Call a method of the member simulations."""
+        return [getattr(self.simulations[i], method_name)(*method_args, **method_kwargs)
+                for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -1,48 +1,239 @@
-import gymnasium as gym
-from stable_baselines3 import PPO
-from stable_baselines3.common.env_checker import check_env
-from stable_baselines3.common.monitor import Monitor
-from humanoid_env_rl import HumanoidEnv
+import argparse
+import os
 import sys
 
-# Create the humanoid environment
-env = HumanoidEnv()
-
-# Check the environment for compatibility with OpenAI Gym standards
-check_env(env, warn=True)
-
-# Wrap the environment with a Monitor to log episode rewards and lengths
-env = Monitor(env)
-
-# Define the RL model
-model = PPO(
-    policy="MlpPolicy",  # Multilayer perceptron policy
-    env=env,              # Pass the custom environment
-    verbose=1,            # Print training information
-    tensorboard_log="./humanoid_rl_tensorboard/",  # Log directory for TensorBoard
-    learning_rate=3e-1,   # Learning rate for optimization
-    gamma=0.99,           # Discount factor
-    n_steps=2048,         # Number of steps to run per rollout
-    batch_size=64,        # Minibatch size for training
-    n_epochs=10,          # Number of optimization epochs per update
-)
-
-# # Train the model
-if sys.argv[1]=="load":
-    model = PPO.load("humanoid_ppo_model", env=env)
-else:
-    TIMESTEPS = 10000  # Set the number of timesteps for training
-    model.learn(total_timesteps=TIMESTEPS)
-    model.save("humanoid_ppo_model")
-
-# Test the trained model
-obs = env.reset()[0]
-done = False
-while not done:
-    action, _states = model.predict(obs, deterministic=True)  # Get action from the model
-    # print(env.step(action) ) # uncomment to see the output
-    obs, reward, done,_, info = env.step(action)  # Perform the action in the environment
-    env.render()  # Render the environment (visualization)
-
-# Close the environment
-env.close()
+# Heavy modules (stable_baselines3, torch, pygame, Box2D) are imported inside the commands
+# that need them, so `eval` with a cached policy never loads torch
+
+# PPO settings used by `train`, and the defaults that sweep.py searches around
+PPO_CONFIG = {
+    'learning_rate': 3e-1,  # Learning rate for optimization
+    'gamma': 0.99,          # Discount factor
+    'n_steps': 2048,        # Number of steps to run per rollout (per environment)
+    'batch_size': 64,       # Minibatch size for training
+    'n_epochs': 10,         # Number of optimization epochs per update
+}
+TIMESTEPS = 10000  # Number of timesteps for training
+
+def make_env(num_envs=1, num_workers=None, seed=0, normalize=True, gamma=0.99, check_env=False,
+             headless=False, max_episode_steps=None, **env_kwargs):
+    """
+    Create the training environments.
+
+    Args:
+        num_envs (int): Number of environments, run in worker processes when above 1.
+        num_workers (int, optional): Number of worker processes, defaults to one per core.
+        seed (int): Base seed of the parallel workers.
+        normalize (bool): Normalize the observations and rewards with running statistics.
+        gamma (float): Discount factor of the reward normalization, the one PPO uses.
+        check_env (bool): Check the single environment against the Gym API.
+        headless (bool): Run the single environment without a window (workers always are).
+        max_episode_steps (int, optional): Cut the episodes short after this many steps, so
+            episodes end (and the monitors report rewards) even if the goal is never reached.
+        **env_kwargs: Extra HumanoidEnv arguments (frame_skip, profile, ...).
+
+    Returns:
+        VecEnv or gym.Env: The monitored environments.
+    """
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import DummyVecEnv, VecMonitor, VecNormalize
+
+    if num_envs > 1:
+        from parallel_vec_env import SharedMemoryVecEnv
+
+        # Collect the rollouts in parallel worker processes
+        env = VecMonitor(SharedMemoryVecEnv(num_envs, num_workers=num_workers, seed=seed,
+                                            max_episode_steps=max_episode_steps, **env_kwargs))
+    else:
+        from humanoid_env_rl import HumanoidEnv
+
+        # Create the humanoid environment
+        env = HumanoidEnv(headless=headless, **env_kwargs)
+
+        if check_env:
+            from stable_baselines3.common.env_checker import check_env
+
+            # Check the environment for compatibility with OpenAI Gym standards
+            check_env(env, warn=True)
+
+        if max_episode_steps is not None:
+            from gymnasium.wrappers import TimeLimit
+
+            env = TimeLimit(env, max_episode_steps)
+
+        # Wrap the environment with a Monitor to log episode rewards and lengths
+        env = Monitor(env)
+        if normalize:
+            env = DummyVecEnv([lambda monitor=env: monitor])
+
+    if normalize:
+        # Scale the observations and rewards with running statistics. The wrapper sits in
+        # this process, above the monitors (which keep logging raw rewards), so each update
+        # merges the batch of every worker into one set of statistics
+        env = VecNormalize(env, gamma=gamma)
+    return env
+
+def save_model(model, path):
+    """Save a trained model, with the normalization statistics of its environment if any."""
+    from stable_baselines3.common.vec_env import VecNormalize
+    from normalization import normalization_path, save_normalization
+
+    model.save(path)
+    if isinstance(model.get_env(), VecNormalize):
+        # Evaluation loads these statistics with the model and keeps them frozen
+        save_normalization(model.get_env(), normalization_path(path))
+    elif os.path.exists(normalization_path(path)):
+        # Statistics left by an earlier normalized model would be applied to this one
+        os.remove(normalization_path(path))
+
+def train(args):
+    """Train a PPO model and save it to args.model."""
+    from stable_baselines3 import PPO
+    from callbacks import ProfilerCallback
+    from profiling import format_summary
+
+    env = make_env(args.num_envs, num_workers=args.num_workers, seed=args.seed, normalize=args.normalize,
+                   gamma=PPO_CONFIG['gamma'], check_env=args.check_env, frame_skip=args.frame_skip,
+                   max_episode_steps=args.max_episode_steps, profile=args.profile,
+                   contact_observations=args.contact_observations)
+
+    # Define the RL model
+    model = PPO(
+        policy="MlpPolicy",  # Multilayer perceptron policy
+        env=env,              # Pass the custom environment
+        verbose=1,            # Print training information
+        tensorboard_log="./humanoid_rl_tensorboard/",  # Log directory for TensorBoard
+        **PPO_CONFIG,
+    )
+
+    # Train the model
+    profiler_callback = ProfilerCallback() if args.profile else None
+    model.learn(total_timesteps=args.timesteps, callback=profiler_callback)
+    save_model(model, args.model)
+    if profiler_callback is not None and profiler_callback.total is not None:
+        print("Environment profile over the training:")
+        print(format_summary(profiler_callback.total))
+    env.close()
+
+def evaluate(args):
+    """Play an episode with the saved model, in a window or recorded offscreen."""
+    from humanoid_env_rl import HumanoidEnv
+    from policy_cache import load_policy
+
+    # The policy weights are cached under the hash of the zip, so only the first
+    # evaluation of a model unpacks it with stable_baselines3
+    policy = load_policy(args.model)
+
+    recorder = None
+    if args.record:
+        from recording import FrameRecorder
+
+        # Render offscreen at full speed and stream the frames to disk
+        eval_env = HumanoidEnv(headless=True, frame_skip=args.frame_skip,
+                               render_mode="rgb_array", render_scale=args.render_scale,
+                               contact_observations=args.contact_observations)
+        recorder = FrameRecorder(args.record)
+    else:
+        eval_env = HumanoidEnv(frame_skip=args.frame_skip, contact_observations=args.contact_observations)
+    if args.max_steps:
+        from gymnasium.wrappers import TimeLimit
+
+        # Episodes otherwise only end at the goal, which a weak policy may never reach
+        eval_env = TimeLimit(eval_env, args.max_steps)
+    if args.trajectories:
+        from trajectory import TrajectoryRecorder
+
+        eval_env = TrajectoryRecorder(eval_env, args.trajectories)
+
+    if args.check_env:
+        from stable_baselines3.common.env_checker import check_env
+
+        check_env(eval_env.unwrapped, warn=True)
+
+    obs = eval_env.reset()[0]
+    done = truncated = False
+    while not (done or truncated):
+        action, _states = policy.predict(obs, deterministic=True)  # Get action from the model
+        # print(eval_env.step(action) ) # uncomment to see the output
+        obs, reward, done, truncated, info = eval_env.step(action)  # Perform the action in the environment
+        frame = eval_env.render()  # Render the environment (visualization)
+        if recorder is not None:
+            recorder.add(frame)
+
+    # Close the environment
+    if recorder is not None:
+        recorder.end_episode()
+        recorder.close()
+    eval_env.close()
+
+def run_sweep(args):
+    """Run sweep.py with the remaining arguments."""
+    import sweep
+
+    sweep.main(args.script_args)
+
+def bench(args):
+    """Run benchmark.py with the remaining arguments."""
+    import benchmark
+
+    benchmark.main(args.script_args)
+
+def main():
+    parser = argparse.ArgumentParser(description="Train, evaluate, benchmark or tune the humanoid walking PPO model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--model", default="humanoid_ppo_model", help="Path of the saved PPO model")
+    common.add_argument("--frame-skip", type=int, default=1,
+                        help="Number of physics steps each action is repeated for")
+    common.add_argument("--contact-observations", action="store_true",
+                        help="Add per body part ground contact flags and impulses to the observations")
+    common.add_argument("--check-env", action="store_true",
+                        help="Check the environment against the Gym API before using it")
+
+    train_parser = subparsers.add_parser("train", parents=[common], help="Train a new model")
+    train_parser.add_argument("--num-envs", type=int, default=1,
+                              help="Number of environments collecting rollouts, run in worker processes when above 1")
+    train_parser.add_argument("--num-workers", type=int, default=None,
+                              help="Number of worker processes for the environments (default: one per core)")
+    train_parser.add_argument("--seed", type=int, default=0, help="Base seed of the parallel workers")
+    train_parser.add_argument("--timesteps", type=int, default=TIMESTEPS, help="Number of timesteps to train for")
+    train_parser.add_argument("--max-episode-steps", type=int, default=None,
+                              help="Cut the episodes short after this many steps (default: only the goal ends them)")
+    train_parser.add_argument("--no-normalize", dest="normalize", action="store_false",
+                              help="Feed the raw observations and rewards to PPO instead of normalizing them")
+    train_parser.add_argument("--profile", action="store_true",
+                              help="Time the phases of the environment steps, log them to TensorBoard and print a summary")
+    train_parser.set_defaults(func=train)
+
+    # "load" is the name this command had before the subcommands
+    eval_parser = subparsers.add_parser("eval", aliases=["load"], parents=[common],
+                                        help="Play an episode with the saved model")
+    eval_parser.add_argument("--record", metavar="DIR", default=None,
+                             help="Render offscreen and stream the frames to DIR instead of a window")
+    eval_parser.add_argument("--trajectories", metavar="DIR", default=None,
+                             help="Record the transitions to memory-mapped files in DIR")
+    eval_parser.add_argument("--max-steps", type=int, default=1000,
+                             help="Steps after which the episode is cut short (0 for no limit)")
+    eval_parser.add_argument("--render-scale", type=float, default=1.0,
+                             help="Scale of the recorded frames relative to 1600x600")
+    eval_parser.set_defaults(func=evaluate)
+
+    bench_parser = subparsers.add_parser("bench", help="Run benchmark.py, e.g. `bench suite --workers 4`")
+    bench_parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments for benchmark.py")
+    bench_parser.set_defaults(func=bench)
+
+    sweep_parser = subparsers.add_parser("sweep", help="Run sweep.py, e.g. `sweep --trials 16 --cores-per-trial 2`")
+    sweep_parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments for sweep.py")
+    sweep_parser.set_defaults(func=run_sweep)
+
+    args, extra = parser.parse_known_args()
+    if args.command in ("bench", "sweep"):
+        # Pass everything after the command on, argparse.REMAINDER drops it when it starts with an option
+        args.script_args = sys.argv[2:]
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
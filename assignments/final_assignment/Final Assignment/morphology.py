@@ -0,0 +1,155 @@
+import copy
+import json
+import Box2D
+from Box2D.b2 import polygonShape
+import numpy as np
+
+# The default humanoid. Limbs are boxes placed relative to the spawn point of the torso,
+# joints are motorized revolute joints between two limbs, anchored in each limb's frame.
+# Sizes are in meters. The observation layout (humanoid.STATE_KEYS) expects these limb names
+# and four joints, in this order; their dimensions, densities, anchors, limits, motors and
+# collision filters can all be changed.
+DEFAULT_MORPHOLOGY = {
+    'limbs': [
+        {'name': 'torso', 'size': [0.3, 1.0], 'offset': [0.0, 0.0], 'density': 1.0,
+         'category': 0x0001, 'mask': 0x0001, 'image': './assets/torso.png'},
+        {'name': 'left_thigh', 'size': [0.2, 0.5], 'offset': [-0.15, -0.75], 'density': 1.0,
+         'category': 0x0002, 'mask': 0x0001, 'image': './assets/left_thigh.png'},
+        {'name': 'left_shin', 'size': [0.2, 0.5], 'offset': [-0.15, -1.25], 'density': 1.0,
+         'category': 0x0002, 'mask': 0x0001, 'image': './assets/left_shin.png'},
+        {'name': 'right_thigh', 'size': [0.2, 0.5], 'offset': [0.15, -0.75], 'density': 1.0,
+         'category': 0x0004, 'mask': 0x0001, 'image': './assets/right_thigh.png'},
+        {'name': 'right_shin', 'size': [0.2, 0.5], 'offset': [0.15, -1.25], 'density': 1.0,
+         'category': 0x0004, 'mask': 0x0001, 'image': './assets/right_shin.png'},
+    ],
+    'joints': [
+        {'name': 'left_hip', 'limbs': ['torso', 'left_thigh'], 'anchor_a': [-0.15, -0.5], 'anchor_b': [0.0, 0.25],
+         'max_motor_torque': 40.0, 'limits': None},
+        {'name': 'left_knee', 'limbs': ['left_thigh', 'left_shin'], 'anchor_a': [0.0, -0.25], 'anchor_b': [0.0, 0.25],
+         'max_motor_torque': 40.0, 'limits': None},
+        {'name': 'right_hip', 'limbs': ['torso', 'right_thigh'], 'anchor_a': [0.15, -0.5], 'anchor_b': [0.0, 0.25],
+         'max_motor_torque': 40.0, 'limits': None},
+        {'name': 'right_knee', 'limbs': ['right_thigh', 'right_shin'], 'anchor_a': [0.0, -0.25], 'anchor_b': [0.0, 0.25],
+         'max_motor_torque': 40.0, 'limits': None},
+    ],
+}
+
+class MorphologyTemplate:
+    """
+    A morphology spec compiled to Box2D definitions.
+
+    The body and fixture definitions are shared by every humanoid built from the template
+    (Box2D copies them when creating bodies), so building a humanoid only creates bodies
+    and joints.
+
+    Attributes:
+        limbs (list): (name, offset, b2BodyDef, b2FixtureDef, image path, image size in pixels) per limb.
+        joints (list): (name, limb index A, limb index B, joint parameters) per joint.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        names = [limb['name'] for limb in spec['limbs']]
+        self.limbs = []
+        for limb in spec['limbs']:
+            width, height = limb['size']
+            body_def = Box2D.b2BodyDef()
+            body_def.type = Box2D.b2_dynamicBody
+            fixture_def = Box2D.b2FixtureDef(
+                shape=polygonShape(box=(width / 2, height / 2)),
+                density=limb['density'],
+                filter=Box2D.b2Filter(categoryBits=limb['category'], maskBits=limb['mask']))
+            image_size = (int(width * 100), int(height * 100))
+            self.limbs.append((limb['name'], tuple(limb['offset']), body_def, fixture_def, limb['image'], image_size))
+
+        self.joints = []
+        for joint in spec['joints']:
+            parameters = {
+                'localAnchorA': tuple(joint['anchor_a']),
+                'localAnchorB': tuple(joint['anchor_b']),
+                'enableMotor': True,
+                'maxMotorTorque': joint['max_motor_torque'],
+            }
+            if joint.get('limits') is not None:
+                parameters.update(enableLimit=True, lowerAngle=joint['limits'][0], upperAngle=joint['limits'][1])
+            limb_a, limb_b = joint['limbs']
+            self.joints.append((joint['name'], names.index(limb_a), names.index(limb_b), parameters))
+
+def morphology_key(spec):
+    """
+    Get a hashable key identifying a spec by its contents.
+
+    Returns:
+        str: The spec as canonical JSON.
+    """
+    return json.dumps(spec, sort_keys=True)
+
+# Compiled templates shared by every humanoid in the process, keyed by morphology_key()
+_template_cache = {}
+_default_template = None
+
+def get_template(spec=None):
+    """
+    Get the compiled template of a spec, compiling it the first time.
+
+    Args:
+        spec (dict or MorphologyTemplate, optional): Morphology spec, defaults to
+            DEFAULT_MORPHOLOGY. A template is returned as is, which skips hashing the spec
+            when many humanoids share it.
+
+    Returns:
+        MorphologyTemplate: The shared template.
+    """
+    global _default_template
+    if isinstance(spec, MorphologyTemplate):
+        return spec
+    if spec is None:
+        if _default_template is None:
+            _default_template = get_template(DEFAULT_MORPHOLOGY)
+        return _default_template
+    key = morphology_key(spec)
+    if key not in _template_cache:
+        # Copy the spec so later changes to the caller's dict cannot desync the template
+        _template_cache[key] = MorphologyTemplate(copy.deepcopy(spec))
+    return _template_cache[key]
+
+def randomize_morphology(seed, scale=0.1, spec=None):
+    """
+    Draw a morphology around a spec for domain randomization.
+
+    Limb sizes, densities and motor torques are multiplied by factors drawn uniformly in
+    [1 - scale, 1 + scale], and the limb offsets and joint anchors follow the new sizes.
+
+    Args:
+        seed (int): Seed of the draw, the same seed gives the same morphology.
+        scale (float): Relative spread of the factors.
+        spec (dict, optional): The spec to randomize, defaults to DEFAULT_MORPHOLOGY.
+
+    Returns:
+        dict: The new spec.
+    """
+    spec = copy.deepcopy(spec or DEFAULT_MORPHOLOGY)
+    rng = np.random.default_rng(seed)
+    limbs = {limb['name']: limb for limb in spec['limbs']}
+    factors = {}
+    for limb in spec['limbs']:
+        factor_x, factor_y, factor_density = rng.uniform(1 - scale, 1 + scale, 3).tolist()
+        factors[limb['name']] = (factor_x, factor_y)
+        limb['size'] = [limb['size'][0] * factor_x, limb['size'][1] * factor_y]
+        limb['density'] *= factor_density
+    for joint in spec['joints']:
+        joint['max_motor_torque'] *= float(rng.uniform(1 - scale, 1 + scale))
+        for anchor, name in (('anchor_a', joint['limbs'][0]), ('anchor_b', joint['limbs'][1])):
+            factor_x, factor_y = factors[name]
+            joint[anchor] = [joint[anchor][0] * factor_x, joint[anchor][1] * factor_y]
+
+    # Chain the limbs from the torso down so the joint anchors meet again
+    placed = {spec['limbs'][0]['name']}
+    for joint in spec['joints']:
+        name_a, name_b = joint['limbs']
+        if name_a in placed and name_b not in placed:
+            offset_a = limbs[name_a]['offset']
+            limbs[name_b]['offset'] = [offset_a[0] + joint['anchor_a'][0] - joint['anchor_b'][0],
+                                       offset_a[1] + joint['anchor_a'][1] - joint['anchor_b'][1]]
+            placed.add(name_b)
+    return spec
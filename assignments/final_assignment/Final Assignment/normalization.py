@@ -0,0 +1,73 @@
+import numpy as np
+from concurrency import atomic_write
+
+# The statistics of a model are saved next to its zip, e.g. humanoid_ppo_model_normalization.npz
+NORMALIZATION_SUFFIX = "_normalization.npz"
+
+def normalization_path(model_path):
+    """
+    Get the path of the normalization statistics saved with a model.
+
+    Args:
+        model_path (str): The saved model, with or without the .zip extension.
+
+    Returns:
+        str: The .npz path next to the zip.
+    """
+    if model_path.endswith(".zip"):
+        model_path = model_path[:-len(".zip")]
+    return model_path + NORMALIZATION_SUFFIX
+
+def save_normalization(vec_normalize, path):
+    """
+    Save the observation statistics of an SB3 VecNormalize as plain arrays in an .npz file.
+
+    Unlike VecNormalize.save, which pickles the wrapper, the file loads without
+    stable_baselines3. Only what evaluation needs is kept: the reward statistics matter
+    during training alone.
+    """
+    atomic_write(path, lambda temporary_path: np.savez(
+        temporary_path, obs_mean=vec_normalize.obs_rms.mean, obs_var=vec_normalize.obs_rms.var,
+        norm_obs=vec_normalize.norm_obs, clip_obs=vec_normalize.clip_obs, epsilon=vec_normalize.epsilon), ".npz")
+
+class ObservationNormalizer:
+    """
+    Frozen observation scaling, as applied by VecNormalize at the end of training.
+
+    Loading it needs neither torch nor stable_baselines3.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as arrays:
+            self.enabled = bool(arrays['norm_obs'])
+            # Kept in float64 like VecNormalize, so the actions match the SB3 pipeline
+            self.mean = arrays['obs_mean']
+            self.std = np.sqrt(arrays['obs_var'] + arrays['epsilon'])
+            self.clip = float(arrays['clip_obs'])
+
+    def __call__(self, observation):
+        """
+        Scale one observation or a batch of them.
+
+        Returns:
+            np.array: The float32 normalized observations.
+        """
+        observation = np.asarray(observation, dtype=np.float32)
+        if not self.enabled:
+            return observation
+        return np.clip((observation - self.mean) / self.std, -self.clip, self.clip).astype(np.float32)
+
+class NormalizedPolicy:
+    """
+    A policy trained on normalized observations, fed with raw ones.
+
+    predict() has the same signature as the SB3 policies, so it can replace them anywhere
+    (e.g. in evaluate.BatchedPolicy).
+    """
+
+    def __init__(self, policy, normalizer):
+        self.policy = policy
+        self.normalizer = normalizer
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        return self.policy.predict(self.normalizer(observation), state, episode_start, deterministic)
@@ -0,0 +1,238 @@
+import ctypes
+import multiprocessing as mp
+import os
+from gymnasium import spaces
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from concurrency import default_start_method
+from humanoid import STATE_SIZE
+from contacts import CONTACT_SIZE
+from humanoid_vec_env import HumanoidVecEnv
+
+def _shared_array(raw, shape, dtype):
+    """View a multiprocessing RawArray as a NumPy array (no copy)."""
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+def _shared_views(buffers, num_envs, observation_size):
+    """
+    Build the NumPy views over the shared buffers.
+
+    Returns:
+        tuple: actions, observations, rewards, dones, truncation flags and terminal observations.
+    """
+    return (_shared_array(buffers['actions'], (num_envs, 4), np.float32),
+            _shared_array(buffers['observations'], (num_envs, observation_size), np.float32),
+            _shared_array(buffers['rewards'], (num_envs,), np.float32),
+            _shared_array(buffers['dones'], (num_envs,), bool),
+            _shared_array(buffers['truncated'], (num_envs,), bool),
+            _shared_array(buffers['terminal_observations'], (num_envs, observation_size), np.float32))
+
+def _worker(remote, parent_remote, buffers, total_envs, observation_size, start, stop, seed, env_kwargs):
+    """
+    Worker process stepping the humanoids start..stop of the shared buffers.
+
+    Only short commands go through the pipe, the arrays are read and written in place.
+    """
+    parent_remote.close()
+    # Seed the process wide generators from the worker's first member so runs are repeatable
+    np.random.seed(seed + start)
+    actions, observations, rewards, dones, truncated, terminal_observations = _shared_views(
+        buffers, total_envs, observation_size)
+    venv = HumanoidVecEnv(stop - start, **env_kwargs)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == 'step':
+                venv.step_async(actions[start:stop])
+                observations[start:stop], rewards[start:stop], dones[start:stop], infos = venv.step_wait()
+                for i in np.flatnonzero(dones[start:stop]):
+                    terminal_observations[start + i] = infos[i]['terminal_observation']
+                    truncated[start + i] = infos[i]['TimeLimit.truncated']
+                remote.send(None)
+            elif command == 'reset':
+                venv._seeds = data
+                observations[start:stop] = venv.reset()
+                remote.send(None)
+            elif command == 'profile':
+                remote.send(venv.profile_snapshots())
+            elif command == 'get_attr':
+                remote.send(venv.get_attr(*data))
+            elif command == 'set_attr':
+                remote.send(venv.set_attr(*data))
+            elif command == 'env_method':
+                name, args, kwargs, indices = data
+                remote.send(venv.env_method(name, *args, indices=indices, **kwargs))
+            elif command == 'close':
+                venv.close()
+                remote.close()
+                break
+    except KeyboardInterrupt:
+        pass
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Vectorized environment running the humanoids in a pool of worker processes.
+
+    Each worker owns a contiguous block of members and steps them with a HumanoidVecEnv.
+    Actions, observations, rewards, dones, truncation flags and terminal observations live in shared memory,
+    so a step only sends a short command to each worker instead of pickled arrays.
+    Extra keyword arguments (frame_skip, time_step, profile, ...) are passed to HumanoidVecEnv.
+    """
+
+    def __init__(self, num_envs, num_workers=None, seed=0, start_method=None, **env_kwargs):
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = max(1, min(num_workers, num_envs))
+
+        ctx = mp.get_context(start_method or default_start_method())
+
+        # Same observation layout as HumanoidVecEnv
+        observation_size = STATE_SIZE + (CONTACT_SIZE if env_kwargs.get('contact_observations') else 0)
+        self.buffers = {
+            'actions': ctx.RawArray(ctypes.c_float, num_envs * 4),
+            'observations': ctx.RawArray(ctypes.c_float, num_envs * observation_size),
+            'rewards': ctx.RawArray(ctypes.c_float, num_envs),
+            'dones': ctx.RawArray(ctypes.c_bool, num_envs),
+            'truncated': ctx.RawArray(ctypes.c_bool, num_envs),
+            'terminal_observations': ctx.RawArray(ctypes.c_float, num_envs * observation_size),
+        }
+        (self.shared_actions, self.shared_observations, self.shared_rewards, self.shared_dones,
+         self.shared_truncated, self.shared_terminal_observations) = _shared_views(self.buffers, num_envs, observation_size)
+
+        # Split the members into contiguous, nearly equal blocks
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.slices = [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        self.remotes, self.processes = [], []
+        for start, stop in self.slices:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(target=_worker,
+                                  args=(work_remote, remote, self.buffers, num_envs, observation_size,
+                                        start, stop, seed, env_kwargs),
+                                  daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.waiting = False
+        self.closed = False
+
+        # Same spaces as HumanoidEnv
+        action_space = spaces.Box(
+            low=np.array([-1, -1, -1, -1]),
+            high=np.array([1, 1, 1, 1]),
+            dtype=np.float32
+        )
+        observation_space = spaces.Box(
+            low=-np.inf,
+            high=np.inf,
+            shape=(observation_size,),
+            dtype=np.float32
+        )
+        super(SharedMemoryVecEnv, self).__init__(num_envs, observation_space, action_space)
+        self.seed(seed)
+
+    def reset(self):
+        """
+        Reset every humanoid and return the initial observations.
+
+        Returns:
+            np.array: Observations of shape (num_envs, observation size).
+        """
+        for remote, (start, stop) in zip(self.remotes, self.slices):
+            remote.send(('reset', self._seeds[start:stop]))
+        for remote in self.remotes:
+            remote.recv()
+        self._reset_seeds()
+        self._reset_options()
+        return self.shared_observations.copy()
+
+    def step_async(self, actions):
+        self.shared_actions[:] = actions
+        for remote in self.remotes:
+            remote.send(('step', None))
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Wait for the workers and collect the results of the step.
+
+        Returns:
+            observations (np.array): (num_envs, observation size) observations, reset ones for finished members.
+            rewards (np.array): (num_envs,) rewards.
+            dones (np.array): (num_envs,) episode end flags.
+            infos (list): One dict per member, with the terminal observation of finished ones.
+        """
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(self.shared_dones):
+            infos[i]['terminal_observation'] = self.shared_terminal_observations[i].copy()
+            infos[i]['TimeLimit.truncated'] = bool(self.shared_truncated[i])
+        return (self.shared_observations.copy(), self.shared_rewards.copy(),
+                self.shared_dones.copy(), infos)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def profile_snapshots(self):
+        """
+        Get the profiler counters of every worker and start new windows.
+
+        Returns:
+            list: One snapshot per worker, empty when profiling is disabled.
+        """
+        for remote in self.remotes:
+            remote.send(('profile', None))
+        return [snapshot for remote in self.remotes for snapshot in remote.recv()]
+
+    def _worker_indices(self, indices):
+        """
+        Group global member indices by worker.
+
+        Returns:
+            list: (remote, local indices) pairs for the workers owning some of the indices.
+        """
+        indices = list(self._get_indices(indices))
+        groups = []
+        for remote, (start, stop) in zip(self.remotes, self.slices):
+            local = [i - start for i in indices if start <= i < stop]
+            if local:
+                groups.append((remote, local))
+        return groups
+
+    def get_attr(self, attr_name, indices=None):
+        """Return an attribute of the member simulations."""
+        groups = self._worker_indices(indices)
+        for remote, local in groups:
+            remote.send(('get_attr', (attr_name, local)))
+        return [value for remote, _ in groups for value in remote.recv()]
+
+    def set_attr(self, attr_name, value, indices=None):
+        """Set an attribute on the member simulations."""
+        groups = self._worker_indices(indices)
+        for remote, local in groups:
+            remote.send(('set_attr', (attr_name, value, local)))
+        for remote, _ in groups:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Call a method of the member simulations."""
+        groups = self._worker_indices(indices)
+        for remote, local in groups:
+            remote.send(('env_method', (method_name, method_args, method_kwargs, local)))
+        return [value for remote, _ in groups for value in remote.recv()]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import numpy as np
+from concurrency import atomic_write
+from normalization import NormalizedPolicy, ObservationNormalizer, normalization_path
+
+# Activations of the MlpPolicy networks that NumpyPolicy can run
+ACTIVATIONS = {
+    'Tanh': np.tanh,
+    'ReLU': lambda x: np.maximum(x, 0.0),
+    'Identity': lambda x: x,
+}
+
+def file_hash(path):
+    """
+    Hash a file.
+
+    Returns:
+        str: The hex SHA-256 of its contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def export_policy(policy, path):
+    """
+    Save the actor of an SB3 MlpPolicy as plain arrays in an .npz file.
+
+    Raises:
+        ValueError: If the policy is not a Gaussian MLP policy over flat observations.
+    """
+    from stable_baselines3.common.distributions import DiagGaussianDistribution
+    from stable_baselines3.common.torch_layers import FlattenExtractor
+
+    if (not isinstance(policy.action_dist, DiagGaussianDistribution) or policy.squash_output
+            or not isinstance(policy.pi_features_extractor, FlattenExtractor)):
+        raise ValueError(f"Cannot export {type(policy).__name__} as a NumPy MLP")
+
+    arrays = {}
+    activations = []
+    layers = list(policy.mlp_extractor.policy_net) + [policy.action_net]
+    for module in layers:
+        name = type(module).__name__
+        if name == 'Linear':
+            index = len(activations)
+            arrays[f'weight_{index}'] = module.weight.detach().cpu().numpy()
+            arrays[f'bias_{index}'] = module.bias.detach().cpu().numpy()
+            activations.append('Identity')
+        elif name in ACTIVATIONS and activations:
+            activations[-1] = name
+        else:
+            raise ValueError(f"Cannot export layer {name} as a NumPy MLP")
+    arrays['activations'] = np.array(activations)
+    arrays['log_std'] = policy.log_std.detach().cpu().numpy()
+    arrays['low'] = policy.action_space.low
+    arrays['high'] = policy.action_space.high
+    np.savez(path, **arrays)
+
+class NumpyPolicy:
+    """
+    The actor of an exported MlpPolicy, run with NumPy.
+
+    Loading it needs neither torch nor stable_baselines3, and predict() has the same
+    signature as the SB3 policies.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as arrays:
+            activations = arrays['activations'].tolist()
+            self.layers = [(arrays[f'weight_{i}'].T.copy(), arrays[f'bias_{i}'], ACTIVATIONS[name])
+                           for i, name in enumerate(activations)]
+            self.std = np.exp(arrays['log_std'])
+            self.low = arrays['low']
+            self.high = arrays['high']
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        """
+        Get the actions for one observation or a batch of them.
+
+        Returns:
+            tuple: The actions clipped to the action space, and None (no recurrent state).
+        """
+        x = np.asarray(observation, dtype=np.float32)
+        for weight, bias, activation in self.layers:
+            x = activation(x @ weight + bias)
+        if not deterministic:
+            x = x + self.std * np.random.standard_normal(x.shape).astype(np.float32)
+        return np.clip(x, self.low, self.high), None
+
+def load_policy(model_path, cache_dir=None):
+    """
+    Load the policy of a saved PPO model, going through the cache when possible.
+
+    The first load of a zip unpacks it with stable_baselines3 and exports the actor under
+    the zip's hash; later loads only read that file. If the model was trained with
+    normalized observations, the policy is wrapped to apply the saved statistics.
+
+    Args:
+        model_path (str): The saved model, with or without the .zip extension.
+        cache_dir (str, optional): Cache directory, defaults to .policy_cache next to the model.
+
+    Returns:
+        NumpyPolicy, or the SB3 policy itself when its architecture cannot be exported,
+        wrapped in a normalization.NormalizedPolicy when the model has statistics.
+    """
+    if not model_path.endswith(".zip"):
+        model_path += ".zip"
+    policy = _load_actor(model_path, cache_dir)
+    statistics_path = normalization_path(model_path)
+    if os.path.exists(statistics_path):
+        policy = NormalizedPolicy(policy, ObservationNormalizer(statistics_path))
+    return policy
+
+def _load_actor(model_path, cache_dir):
+    """Load the actor of a zip, from the cache or by exporting it."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(model_path), ".policy_cache")
+    cache_path = os.path.join(cache_dir, file_hash(model_path) + ".npz")
+    if os.path.exists(cache_path):
+        return NumpyPolicy(cache_path)
+
+    from stable_baselines3 import PPO
+
+    policy = PPO.load(model_path, device="cpu").policy
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        atomic_write(cache_path, lambda temporary_path: export_policy(policy, temporary_path), ".npz")
+    except ValueError:
+        return policy
+    return NumpyPolicy(cache_path)
@@ -0,0 +1,117 @@
+import time
+
+# Phases of an environment step, in the order they run
+PHASES = ('motors', 'physics', 'state', 'reward', 'done', 'render')
+
+class StepProfiler:
+    """
+    Accumulates the time spent in each phase of the environment steps, and counts steps and resets.
+
+    Environments only hold a profiler when profiling is enabled; otherwise they check a single
+    attribute per step and take their normal code path.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Start a new measurement window."""
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.resets = 0
+        self.window_start = time.perf_counter()
+
+    def snapshot(self, clear=True):
+        """
+        Get the counters of the current window.
+
+        Args:
+            clear (bool): Start a new window afterwards.
+
+        Returns:
+            dict: elapsed (seconds), steps, resets and totals (seconds per phase).
+        """
+        snapshot = {
+            'elapsed': time.perf_counter() - self.window_start,
+            'steps': self.steps,
+            'resets': self.resets,
+            'totals': dict(self.totals),
+        }
+        if clear:
+            self.clear()
+        return snapshot
+
+def merge_snapshots(snapshots):
+    """
+    Combine the snapshots of environments that ran side by side.
+
+    Returns:
+        dict: Summed counters, over the longest of the windows.
+    """
+    merged = {'elapsed': 0.0, 'steps': 0, 'resets': 0, 'totals': dict.fromkeys(PHASES, 0.0)}
+    for snapshot in snapshots:
+        merged['elapsed'] = max(merged['elapsed'], snapshot['elapsed'])
+        merged['steps'] += snapshot['steps']
+        merged['resets'] += snapshot['resets']
+        for phase, total in snapshot['totals'].items():
+            merged['totals'][phase] += total
+    return merged
+
+def summarize(snapshot):
+    """
+    Turn a snapshot into rates and mean phase durations.
+
+    Returns:
+        dict: env_steps_per_sec, the rate over the time spent in the environment phases alone
+        (summed over the environments); samples_per_sec and resets_per_sec, over the wall
+        clock window, which also covers whatever ran between the steps (e.g. policy inference
+        and PPO updates); and <phase>_us, the mean time per step of each phase.
+    """
+    elapsed = max(snapshot['elapsed'], 1e-9)
+    steps = max(snapshot['steps'], 1)
+    env_time = max(sum(snapshot['totals'].values()), 1e-9)
+    summary = {
+        'env_steps_per_sec': snapshot['steps'] / env_time,
+        'samples_per_sec': snapshot['steps'] / elapsed,
+        'resets_per_sec': snapshot['resets'] / elapsed,
+    }
+    for phase, total in snapshot['totals'].items():
+        summary[f'{phase}_us'] = total / steps * 1e6
+    return summary
+
+def add_windows(first, second):
+    """Combine two consecutive snapshots of the same environments."""
+    merged = merge_snapshots([first, second])
+    merged['elapsed'] = first['elapsed'] + second['elapsed']
+    return merged
+
+def collect_snapshot(env):
+    """
+    Collect and merge the profiler counters of every environment behind a vectorized env.
+
+    Returns:
+        dict: The merged snapshot, or None if profiling is disabled.
+    """
+    if hasattr(env, 'profile_snapshots'):
+        # HumanoidVecEnv and SharedMemoryVecEnv profile whole batches
+        snapshots = env.profile_snapshots()
+    else:
+        snapshots = [profiler.snapshot() for profiler in env.get_attr('profiler') if profiler is not None]
+    return merge_snapshots(snapshots) if snapshots else None
+
+def format_summary(snapshot):
+    """
+    Format a snapshot as a small table.
+
+    Returns:
+        str: One line per rate and per phase.
+    """
+    summary = summarize(snapshot)
+    lines = [f"{'env steps/s':>12}: {summary['env_steps_per_sec']:.0f}",
+             f"{'samples/s':>12}: {summary['samples_per_sec']:.0f}",
+             f"{'resets/s':>12}: {summary['resets_per_sec']:.2f}"]
+    step_total = sum(snapshot['totals'].values()) or 1.0
+    for phase in PHASES:
+        share = snapshot['totals'][phase] / step_total * 100
+        lines.append(f"{phase:>12}: {summary[f'{phase}_us']:8.2f} us/step ({share:4.1f}%)")
+    return "\n".join(lines)
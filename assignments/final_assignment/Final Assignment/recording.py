@@ -0,0 +1,118 @@
+import glob
+import os
+import queue
+import threading
+import numpy as np
+
+class FrameRecorder:
+    """
+    Streams rendered frames to disk in fixed size chunks.
+
+    Frames are copied into one of two preallocated chunk buffers. When a chunk is full it
+    is handed to a writer thread and saved as episode_<e>_chunk_<c>.npy while the other
+    buffer fills up, so memory use stays at two chunks however long the evaluation runs.
+
+    Chunks hold about chunk_bytes of frames (64 MB, 23 full size 1600x600 frames), unless
+    chunk_size sets their number of frames. Chunks of an earlier recording in the same
+    directory are removed.
+    """
+
+    def __init__(self, directory, chunk_size=None, chunk_bytes=64 << 20):
+        os.makedirs(directory, exist_ok=True)
+        # Stale chunks would otherwise be loaded as part of this recording's episodes
+        for path in glob.glob(os.path.join(directory, "episode_*_chunk_*.npy")):
+            os.remove(path)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.buffers = None
+        self.current = 0
+        self.count = 0
+        self.episode = 0
+        self.chunk_index = 0
+
+        # A buffer is free once the writer thread has saved it
+        self.free = [threading.Event(), threading.Event()]
+        for event in self.free:
+            event.set()
+        self.pending = queue.Queue()
+        # First error of the writer thread, raised by the next add(), flush() or close()
+        self.error = None
+        self.writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self.writer.start()
+
+    def _write_chunks(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            path, frames, index = item
+            try:
+                np.save(path, frames)
+            except Exception as error:
+                # Keep the buffer usable so the caller gets the error instead of blocking forever
+                if self.error is None:
+                    self.error = error
+            finally:
+                self.free[index].set()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def add(self, frame):
+        """Append a frame (H, W, 3) to the current episode."""
+        self._raise_error()
+        if self.buffers is None:
+            if self.chunk_size is None:
+                # The frame size is only known now
+                self.chunk_size = max(1, self.chunk_bytes // frame.nbytes)
+            self.buffers = [np.empty((self.chunk_size, *frame.shape), dtype=frame.dtype) for _ in range(2)]
+        self.buffers[self.current][self.count] = frame
+        self.count += 1
+        if self.count == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Send the frames collected so far to the writer thread."""
+        if self.count == 0:
+            return
+        path = os.path.join(self.directory, f"episode_{self.episode:05d}_chunk_{self.chunk_index:05d}.npy")
+        self.free[self.current].clear()
+        self.pending.put((path, self.buffers[self.current][:self.count], self.current))
+        self.current = 1 - self.current
+        self.count = 0
+        self.chunk_index += 1
+        # Only blocks if the writer is still saving the chunk before the one just sent
+        self.free[self.current].wait()
+        self._raise_error()
+
+    def end_episode(self):
+        """Flush the current episode, the next frames start a new one."""
+        self.flush()
+        self.episode += 1
+        self.chunk_index = 0
+
+    def close(self):
+        """Flush the remaining frames and stop the writer thread."""
+        try:
+            self.flush()
+        finally:
+            self.pending.put(None)
+            self.writer.join()
+        self._raise_error()
+
+def load_episode(directory, episode, mmap=True):
+    """
+    Load the frames recorded for an episode.
+
+    Args:
+        directory (str): Directory given to the FrameRecorder.
+        episode (int): Episode number.
+        mmap (bool): Memory-map the chunks instead of reading them.
+
+    Returns:
+        list: The episode's chunks in order, each an array of shape (frames, H, W, 3).
+    """
+    paths = sorted(glob.glob(os.path.join(directory, f"episode_{episode:05d}_chunk_*.npy")))
+    return [np.load(path, mmap_mode='r' if mmap else None) for path in paths]
@@ -0,0 +1,135 @@
+import math
+import pygame
+from humanoid import load_image
+
+class SpriteAtlas:
+    """
+    Copies of a sprite rotated to quantized angles.
+
+    Rotations are rendered the first time an angle bucket is needed (or all at once with
+    prerender()) and then reused, so drawing a body part is a lookup and a blit.
+    """
+
+    def __init__(self, image, angle_steps=360):
+        self.image = image
+        self.angle_steps = angle_steps
+        self.sprites = [None] * angle_steps
+
+    def get(self, angle):
+        """
+        Get the sprite rotated by the given body angle.
+        Args:
+            angle (float): Body angle in radians, counter-clockwise in world coordinates.
+        Returns:
+            pygame.Surface: The rotated sprite, for the nearest quantized angle.
+        """
+        index = int(round(angle * self.angle_steps / (2 * math.pi))) % self.angle_steps
+        sprite = self.sprites[index]
+        if sprite is None:
+            sprite = pygame.transform.rotate(self.image, index * 360.0 / self.angle_steps)
+            self.sprites[index] = sprite
+        return sprite
+
+    def prerender(self):
+        """Render the sprite at every quantized angle."""
+        for index in range(self.angle_steps):
+            self.get(index * 2 * math.pi / self.angle_steps)
+
+# Atlases shared by every renderer in the process, keyed by (path, size, angle_steps)
+_atlas_cache = {}
+
+def get_atlas(path, size, angle_steps=360):
+    """
+    Get the atlas of an image scaled to the given size, building it the first time.
+    """
+    key = (path, size, angle_steps)
+    if key not in _atlas_cache:
+        _atlas_cache[key] = SpriteAtlas(load_image(path, size), angle_steps)
+    return _atlas_cache[key]
+
+# Backgrounds shared by every renderer in the process, keyed by (terrain key, size): the
+# static scene only changes with the terrain. Full size backgrounds take ~4 MB each, so only
+# the most recently baked ones are kept.
+_background_cache = {}
+BACKGROUND_CACHE_SIZE = 16
+
+class Renderer:
+    """
+    Draws a Simulation from a pre-baked background and cached limb sprites.
+
+    The ground, walls and flag are drawn once into a background surface. Each frame only
+    the areas covered by the humanoid in the previous and current frame are redrawn, and
+    draw() returns them so the display can be updated with just those rectangles.
+    A scale below 1 draws a smaller frame, with sprites scaled down accordingly.
+    """
+
+    def __init__(self, simulation, angle_steps=360, scale=1.0):
+        self.simulation = simulation
+        self.scale = scale
+        self.ppm = simulation.ppm * scale
+        self.size = (int(simulation.width * scale), int(simulation.height * scale))
+        self.height = self.size[1]
+        self.parts = [(body, get_atlas(path, (max(1, int(size[0] * scale)), max(1, int(size[1] * scale))), angle_steps))
+                      for body, path, size in simulation.humanoid.sprites()]
+        self.background = self.bake_background()
+        self.previous_rects = None
+
+    def bake_background(self):
+        """
+        Draw the static parts of the scene, once per terrain and size.
+        Returns:
+            pygame.Surface: The background, the size of the rendered frame.
+        """
+        terrain = self.simulation.terrain
+        key = (None if terrain is None else terrain.key, self.size)
+        if key not in _background_cache:
+            if len(_background_cache) >= BACKGROUND_CACHE_SIZE:
+                # Dicts keep insertion order, so the first key is the oldest
+                del _background_cache[next(iter(_background_cache))]
+            _background_cache[key] = self.draw_background()
+        return _background_cache[key]
+
+    def draw_background(self):
+        """Draw the ground, walls and flag into a new surface."""
+        simulation = self.simulation
+        background = pygame.Surface((simulation.width, simulation.height))
+        background.fill(simulation.bg_color)
+        simulation.render_ground(background)
+        simulation.render_walls(background)
+        simulation.render_flag(background)
+        if self.size != background.get_size():
+            background = pygame.transform.smoothscale(background, self.size)
+        return background
+
+    def draw(self, surface):
+        """
+        Draw the current frame onto the surface.
+        Returns:
+            list: The rectangles of the surface that changed since the previous frame.
+        """
+        if self.previous_rects is None:
+            surface.blit(self.background, (0, 0))
+            dirty_rects = [surface.get_rect()]
+        else:
+            # Erase the humanoid drawn in the previous frame
+            for rect in self.previous_rects:
+                surface.blit(self.background, rect, rect)
+            dirty_rects = list(self.previous_rects)
+
+        rects = []
+        for body, atlas in self.parts:
+            sprite = atlas.get(body.angle)
+            position = body.position
+            rect = sprite.get_rect(center=(position.x * self.ppm, self.height - position.y * self.ppm))
+            rects.append(surface.blit(sprite, rect))
+        self.previous_rects = rects
+        return dirty_rects + rects
+
+    def rebake(self):
+        """Switch to the background of the simulation's current terrain."""
+        self.background = self.bake_background()
+        self.invalidate()
+
+    def invalidate(self):
+        """Redraw the whole surface on the next frame."""
+        self.previous_rects = None
@@ -1,14 +1,31 @@
+import time
 import pygame
+import numpy as np
 import Box2D
-from Box2D.b2 import world, polygonShape
+from Box2D.b2 import world, polygonShape, chainShape
 from humanoid import Humanoid
+from contacts import ContactSensor
+from renderer import Renderer
 
 class Simulation:
-    def __init__(self):
-        pygame.init()
+    def __init__(self, headless=False, time_step=1.0 / 60.0, velocity_iterations=6, position_iterations=2,
+                 terrain=None, contacts=False, morphology=None):
         self.width, self.height = 1600, 600
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("2D Humanoid Simulation")
+
+        # Physics step length (in seconds) and Box2D solver iterations
+        self.time_step = time_step
+        self.velocity_iterations = velocity_iterations
+        self.position_iterations = position_iterations
+
+        # A headless simulation never opens a window, and is physics only unless it renders
+        # offscreen frames. The window, images and frame buffer are all created on first use.
+        self.headless = headless
+        self.screen = None
+        self.flag_image = None
+        self.renderer = None
+        self.frame = None
+        self.frame_surface = None
+        self.frame_renderer = None
 
         # Pixels per meter (scaling factor)
         self.ppm = 100
@@ -17,19 +34,13 @@ class Simulation:
         self.bg_color = (255, 255, 255)
         self.ground_color = (0, 0, 0)
 
-        # Load flag image and scale it
-        self.flag_image = pygame.image.load('./assets/flag.png')
-        self.flag_image = pygame.transform.scale(self.flag_image, (50, 50))  # Resize to make it small
-
         # Create the Box2D world
         self.world = world(gravity=(0, -10), doSleep=True)
 
-        # Create ground
+        # Create ground, flat unless a terrain.Terrain is given
         self.ground_height = 50 / self.ppm
-        self.ground = self.world.CreateStaticBody(
-            position=(self.width / (2 * self.ppm), self.ground_height / 2),
-            shapes=polygonShape(box=(self.width / (2 * self.ppm), self.ground_height / 2))
-        )
+        self.terrain = terrain
+        self.ground = self.create_ground(terrain)
 
         # Create left and right boundary walls
         self.left_wall = self.world.CreateStaticBody(
@@ -42,37 +53,175 @@ class Simulation:
             shapes=polygonShape(box=(self.ground_height / 2, self.height / (2 * self.ppm)))
         )
 
-        # Create humanoid
-        self.humanoid = Humanoid(self.world, x=(self.width - 1200) / (2 * self.ppm), y=self.height / self.ppm - self.ground_height)
+        # Create humanoid, from a morphology.py spec when one is given
+        self.humanoid = Humanoid(self.world, x=(self.width - 1200) / (2 * self.ppm), y=self.height / self.ppm - self.ground_height,
+                                 morphology=morphology)
+
+        # Optional contact sensing, updated by Box2D during each step
+        self.contacts = None
+        if contacts:
+            self.contacts = ContactSensor(self.humanoid)
+            self.world.contactListener = self.contacts
+
+    def create_ground(self, terrain):
+        """
+        Create the static ground body.
+        Args:
+            terrain (terrain.Terrain): Surface and obstacles, or None for the flat ground box.
+        Returns:
+            Box2D.b2Body: The ground.
+        """
+        if terrain is None:
+            return self.world.CreateStaticBody(
+                position=(self.width / (2 * self.ppm), self.ground_height / 2),
+                shapes=polygonShape(box=(self.width / (2 * self.ppm), self.ground_height / 2))
+            )
+        ground = self.world.CreateStaticBody(shapes=chainShape(vertices_chain=terrain.surface.tolist()))
+        for x, y, half_width, half_height in terrain.obstacles.tolist():
+            ground.CreatePolygonFixture(box=(half_width, half_height, (x, y), 0.0))
+        return ground
+
+    def set_terrain(self, terrain):
+        """
+        Replace the ground, keeping the world, walls and humanoid. Call reset() afterwards.
+        Args:
+            terrain (terrain.Terrain): The new terrain, or None for the flat ground.
+        """
+        if terrain is self.terrain:
+            return
+        self.world.DestroyBody(self.ground)
+        self.terrain = terrain
+        self.ground = self.create_ground(terrain)
+        for renderer in (self.renderer, self.frame_renderer):
+            if renderer is not None:
+                renderer.rebake()
+
+    def step(self, motor_speeds, totals=None):
+        """
+        Set the joint motor speeds and advance the world by one time step.
+
+        Args:
+            totals (dict, optional): A profiler's phase totals, to add the time spent in the
+                'motors' and 'physics' phases to.
+        """
+        if totals is None:
+            self.humanoid.update_motors(motor_speeds)
+            self.world.Step(self.time_step, self.velocity_iterations, self.position_iterations)
+            return
+        t0 = time.perf_counter()
+        self.humanoid.update_motors(motor_speeds)
+        t1 = time.perf_counter()
+        self.world.Step(self.time_step, self.velocity_iterations, self.position_iterations)
+        totals['physics'] += time.perf_counter() - t1
+        totals['motors'] += t1 - t0
+
+    def reset(self):
+        """Restore the humanoid in place, keeping the world, ground and walls."""
+        self.humanoid.reset()
+        if self.contacts is not None:
+            self.contacts.clear()
+
+    def get_state(self):
+        """
+        Snapshot the simulation. The ground and walls never move, so this is the humanoid's state.
+        Returns:
+            bytes: The snapshot, see Humanoid.get_state().
+        """
+        return self.humanoid.get_state()
 
-    def render_ground(self):
-        """Render the ground."""
+    def set_state(self, snapshot):
+        """Restore a snapshot taken by get_state(), from this simulation or another one."""
+        self.humanoid.set_state(snapshot)
+        if self.contacts is not None:
+            self.contacts.clear()
+
+    def init_rendering(self):
+        """Open the pygame window and load the images, the first time rendering is needed."""
+        if self.headless:
+            raise RuntimeError("Cannot render a headless simulation")
+        if self.screen is not None:
+            return
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.width, self.height))
+        pygame.display.set_caption("2D Humanoid Simulation")
+        self.load_images()
+        self.renderer = Renderer(self)
+
+    def load_images(self):
+        """Load the flag and humanoid images."""
+        if self.flag_image is not None:
+            return
+        # Load flag image and scale it
+        self.flag_image = pygame.image.load('./assets/flag.png')
+        self.flag_image = pygame.transform.scale(self.flag_image, (50, 50))  # Resize to make it small
+        self.humanoid.load_images()
+
+    def render_frame(self, scale=1.0):
+        """
+        Draw the current frame offscreen, without opening a window.
+
+        The frame is drawn straight into a NumPy array shared with the pygame surface, so it
+        is not copied. The same array is overwritten by the next call.
+
+        Returns:
+            np.array: uint8 RGB frame of shape (height * scale, width * scale, 3).
+        """
+        if self.frame_renderer is None or self.frame_renderer.scale != scale:
+            self.load_images()
+            self.frame_renderer = Renderer(self, scale=scale)
+            width, height = self.frame_renderer.size
+            self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+            self.frame_surface = pygame.image.frombuffer(self.frame, (width, height), 'RGB')
+        self.frame_renderer.draw(self.frame_surface)
+        return self.frame
+
+    def render(self):
+        """Draw the current frame and update the changed parts of the window."""
+        self.init_rendering()
+        pygame.display.update(self.renderer.draw(self.screen))
+
+    def render_ground(self, surface=None):
+        """Render the ground (on the screen unless another surface is given)."""
+        surface = self.screen if surface is None else surface
+        if self.terrain is not None:
+            # Fill below the terrain surface, then draw the obstacles
+            points = [(x * self.ppm, self.height - y * self.ppm) for x, y in self.terrain.surface.tolist()]
+            points += [(self.width, self.height), (0, self.height)]
+            pygame.draw.polygon(surface, self.ground_color, points)
+            for x, y, half_width, half_height in self.terrain.obstacles.tolist():
+                pygame.draw.rect(surface, self.ground_color,
+                                 pygame.Rect(int((x - half_width) * self.ppm), int(self.height - (y + half_height) * self.ppm),
+                                             int(2 * half_width * self.ppm), int(2 * half_height * self.ppm)))
+            return
         pygame.draw.rect(
-            self.screen,
+            surface,
             self.ground_color,
             pygame.Rect(0, self.height - int(self.ground_height * self.ppm), self.width, int(self.ground_height * self.ppm)),
         )
 
-    def render_flag(self):
+    def render_flag(self, surface=None):
         """Render the flag image at the right of the window at ground level."""
+        surface = self.screen if surface is None else surface
         flag_x = self.width - self.flag_image.get_width() - 10  # 10px from the right edge
         flag_y = self.height - int(self.ground_height * self.ppm) - self.flag_image.get_height()
-        self.screen.blit(self.flag_image, (flag_x, flag_y))
+        surface.blit(self.flag_image, (flag_x, flag_y))
 
-    def render_walls(self):
+    def render_walls(self, surface=None):
         """Render the boundary walls."""
+        surface = self.screen if surface is None else surface
         pygame.draw.rect(
-            self.screen,
+            surface,
             (0, 0, 0),  # Color for the walls (black)
             pygame.Rect(0, 0, int(self.ground_height * self.ppm), self.height),  # Left wall
         )
         pygame.draw.rect(
-            self.screen,
+            surface,
             (0, 0, 0),  # Color for the walls (black)
             pygame.Rect(self.width - int(self.ground_height * self.ppm), 0, int(self.ground_height * self.ppm), self.height),  # Right wall
         )
 
     def run(self):
+        self.init_rendering()
         clock = pygame.time.Clock()
         running = True
 
@@ -81,20 +230,8 @@ class Simulation:
                 if event.type == pygame.QUIT:
                     running = False
 
-            # Clear the screen
-            self.screen.fill(self.bg_color)
-
-            # Render ground
-            self.render_ground()
-
-            # Render walls
-            self.render_walls()
-
-            # Render flag
-            self.render_flag()
-
-            # Render humanoid
-            self.humanoid.render(self.screen, self.ppm)
+            # Render the scene
+            self.render()
 
             # Update motor speeds (placeholder for dynamic control logic)
             motor_speeds = [0, 0, 0, 0]  # Static motor speeds for now
@@ -107,14 +244,11 @@ class Simulation:
                 running = False
 
             # Update Box2D world
-            self.world.Step(1.0 / 60.0, 6, 2)
+            self.world.Step(self.time_step, self.velocity_iterations, self.position_iterations)
 
             # Cap the frame rate at 60 FPS
             clock.tick(60)
 
-            # Update the display
-            pygame.display.flip()
-
         pygame.quit()
 
 if __name__ == "__main__":
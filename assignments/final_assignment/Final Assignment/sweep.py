@@ -0,0 +1,235 @@
+import argparse
+import csv
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from concurrency import atomic_write, default_start_method
+from model import PPO_CONFIG, TIMESTEPS
+
+# Default search space over model.PPO_CONFIG. A list is a set of choices, a dict a range
+# sampled uniformly, or log-uniformly with "log": true. Ranges of ints give ints.
+SEARCH_SPACE = {
+    'learning_rate': {'low': 1e-5, 'high': 1e-2, 'log': True},
+    'gamma': [0.98, 0.99, 0.995],
+    'n_steps': [512, 1024, 2048],
+    'batch_size': [64, 128, 256],
+    'n_epochs': [5, 10, 20],
+}
+
+RESULT_COLUMNS = ['trial', 'status', 'mean_reward', 'episodes', 'timesteps', 'elapsed']
+
+def sample_config(space, rng):
+    """
+    Draw one PPO configuration from a search space.
+
+    Returns:
+        dict: PPO_CONFIG with the sampled values.
+    """
+    config = dict(PPO_CONFIG)
+    for name, values in space.items():
+        if isinstance(values, dict):
+            low, high = values['low'], values['high']
+            if values.get('log'):
+                value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                value = float(rng.uniform(low, high))
+            if isinstance(low, int) and isinstance(high, int):
+                value = int(round(value))
+        else:
+            value = values[rng.integers(len(values))]
+        config[name] = value
+    return config
+
+def _init_worker(core_sets, cores_per_trial):
+    """Pin a pool process (and the environment workers it starts) to its own cores."""
+    cores = core_sets.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    import torch
+
+    torch.set_num_threads(cores_per_trial)
+
+def run_trial(trial, config, options):
+    """
+    Train one configuration, stopping early if the pruner says so.
+
+    Args:
+        trial (int): Trial number.
+        config (dict): PPO arguments.
+        options (dict): Sweep settings shared by every trial (see main()).
+
+    Returns:
+        dict: The row of the results table.
+    """
+    from stable_baselines3 import PPO
+    from callbacks import MedianPruningCallback
+    from model import make_env, save_model
+
+    row = {'trial': trial, 'status': 'failed', 'mean_reward': float('nan'), 'episodes': 0,
+           'timesteps': 0, 'elapsed': 0.0, **config, 'error': ''}
+    start = time.perf_counter()
+    env = None
+    try:
+        env = make_env(options['num_envs'], num_workers=options['cores_per_trial'], seed=options['seed'] + 1000 * trial,
+                       normalize=options['normalize'], gamma=config['gamma'], headless=True,
+                       max_episode_steps=options['max_episode_steps'], frame_skip=options['frame_skip'])
+        model = PPO(policy="MlpPolicy", env=env, seed=options['seed'] + trial, **config,
+                    tensorboard_log=options['tensorboard_log'])
+        pruner = MedianPruningCallback(options['progress_dir'], trial, options['prune_interval'],
+                                       warmup=options['warmup'], min_trials=options['min_trials'],
+                                       verbose=1) if options['prune'] else None
+        model.learn(total_timesteps=options['timesteps'], callback=pruner, tb_log_name=f"trial_{trial:03d}")
+        rewards = [episode['r'] for episode in model.ep_info_buffer]
+        row.update(status='pruned' if pruner is not None and pruner.pruned else 'complete',
+                   mean_reward=float(np.mean(rewards)) if rewards else float('nan'),
+                   episodes=len(rewards), timesteps=model.num_timesteps)
+        if row['status'] == 'complete':
+            save_model(model, os.path.join(options['models_dir'], f"trial_{trial:03d}"))
+    except Exception as error:
+        row['error'] = f"{type(error).__name__}: {error}"
+    finally:
+        if env is not None:
+            env.close()
+    row['elapsed'] = time.perf_counter() - start
+    return row
+
+def write_results(rows, path):
+    """Write the results table as CSV, best completed trials first."""
+    rank = {'complete': 0, 'pruned': 1, 'failed': 2}
+    rows = sorted(rows, key=lambda row: (rank[row['status']],
+                                         math.inf if math.isnan(row['mean_reward']) else -row['mean_reward']))
+    columns = RESULT_COLUMNS + [name for name in PPO_CONFIG] + ['error']
+
+    def write(temporary_path):
+        with open(temporary_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+
+    # The table can be watched while the sweep runs
+    atomic_write(path, write)
+    return rows
+
+def sweep(space, trials, output, cores_per_trial=1, max_parallel=None, seed=0, **options):
+    """
+    Run a hyperparameter sweep on a local process pool.
+
+    Trial 0 trains the current PPO_CONFIG as a reference, the others sample the space. Each
+    pool process runs one trial at a time, pinned to cores_per_trial cores.
+
+    Args:
+        space (dict): Search space, laid out as SEARCH_SPACE.
+        trials (int): Number of trials.
+        output (str): Directory of the results table, the pruning reports and the models.
+        cores_per_trial (int): Cores each trial may use, for PPO and its environment workers.
+        max_parallel (int, optional): Trials run at once, defaults to the cores / cores_per_trial.
+        seed (int): Seed of the sampling, trials and environments.
+        **options: timesteps, num_envs, frame_skip, max_episode_steps, normalize, prune,
+            prune_interval, warmup, min_trials and tensorboard (see main()).
+
+    Returns:
+        list: The result rows, best first.
+    """
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    cores_per_trial = max(1, min(cores_per_trial, len(cores)))
+    slots = len(cores) // cores_per_trial
+    if max_parallel is not None:
+        slots = max(1, min(slots, max_parallel))
+
+    options = dict(options, seed=seed, cores_per_trial=cores_per_trial,
+                   progress_dir=os.path.join(output, "progress"), models_dir=os.path.join(output, "models"),
+                   tensorboard_log=os.path.join(output, "tensorboard") if options.pop('tensorboard') else None)
+    options['prune_interval'] = options['prune_interval'] or max(options['timesteps'] // 10, 1)
+    os.makedirs(options['progress_dir'], exist_ok=True)
+    # Reports of an earlier sweep in the same directory would skew the medians
+    for name in os.listdir(options['progress_dir']):
+        os.remove(os.path.join(options['progress_dir'], name))
+    os.makedirs(options['models_dir'], exist_ok=True)
+    with open(os.path.join(output, "space.json"), "w") as f:
+        json.dump({'space': space, 'trials': trials, 'options': options}, f, indent=2)
+
+    rng = np.random.default_rng(seed)
+    configs = [dict(PPO_CONFIG)] + [sample_config(space, rng) for _ in range(trials - 1)]
+
+    ctx = mp.get_context(default_start_method())
+    core_sets = ctx.Queue()
+    for slot in range(slots):
+        core_sets.put(cores[slot * cores_per_trial:(slot + 1) * cores_per_trial])
+
+    results_path = os.path.join(output, "results.csv")
+    rows = []
+    with ProcessPoolExecutor(slots, mp_context=ctx, initializer=_init_worker,
+                             initargs=(core_sets, cores_per_trial)) as pool:
+        futures = [pool.submit(run_trial, trial, config, options) for trial, config in enumerate(configs)]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            # Rewrite the table as trials finish, so it can be watched while the sweep runs
+            write_results(rows, results_path)
+            print(f"trial {row['trial']:3d} {row['status']:>8}: reward {row['mean_reward']:.1f} "
+                  f"after {row['timesteps']} timesteps ({row['elapsed']:.0f}s) {row['error']}")
+    return write_results(rows, results_path)
+
+def format_table(rows, limit=10):
+    """
+    Format the best result rows as a small table.
+
+    Returns:
+        str: One line per trial.
+    """
+    names = list(PPO_CONFIG)
+    lines = [f"{'trial':>5} {'status':>8} {'reward':>12} " + " ".join(f"{name:>13}" for name in names)]
+    for row in rows[:limit]:
+        lines.append(f"{row['trial']:>5} {row['status']:>8} {row['mean_reward']:>12.1f} " +
+                     " ".join(f"{row[name]:>13.4g}" for name in names))
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the PPO settings of model.py on a local process pool.")
+    parser.add_argument("--space", default=None,
+                        help="JSON file with the search space, laid out as SEARCH_SPACE (default: SEARCH_SPACE)")
+    parser.add_argument("--trials", type=int, default=16, help="Number of trials, the first one is PPO_CONFIG")
+    parser.add_argument("--output", default="sweep", help="Directory of the results table, reports and models")
+    parser.add_argument("--cores-per-trial", type=int, default=1, help="Cores each trial may use")
+    parser.add_argument("--max-parallel", type=int, default=None,
+                        help="Trials run at once (default: cores / --cores-per-trial)")
+    parser.add_argument("--timesteps", type=int, default=TIMESTEPS, help="Timesteps per trial")
+    parser.add_argument("--num-envs", type=int, default=1,
+                        help="Environments per trial, run in --cores-per-trial worker processes when above 1")
+    parser.add_argument("--frame-skip", type=int, default=1, help="Number of physics steps each action is repeated for")
+    parser.add_argument("--max-episode-steps", type=int, default=1000,
+                        help="Steps after which an episode is cut short, so every trial reports episode rewards")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the sampling and the trials")
+    parser.add_argument("--no-normalize", dest="normalize", action="store_false",
+                        help="Train on the raw observations and rewards")
+    parser.add_argument("--no-prune", dest="prune", action="store_false", help="Run every trial to the end")
+    parser.add_argument("--prune-interval", type=int, default=None,
+                        help="Timesteps between pruning reports (default: a tenth of --timesteps)")
+    parser.add_argument("--warmup", type=int, default=2, help="Policy updates before a trial can be pruned")
+    parser.add_argument("--min-trials", type=int, default=4,
+                        help="Other trials that must have reported before pruning against their median")
+    parser.add_argument("--tensorboard", action="store_true", help="Log every trial to OUTPUT/tensorboard")
+    args = parser.parse_args(argv)
+
+    space = SEARCH_SPACE
+    if args.space is not None:
+        with open(args.space) as f:
+            space = json.load(f)
+    unknown = set(space) - set(PPO_CONFIG)
+    if unknown:
+        raise SystemExit(f"Unknown PPO settings in the search space: {sorted(unknown)}")
+
+    rows = sweep(space, args.trials, args.output, cores_per_trial=args.cores_per_trial,
+                 max_parallel=args.max_parallel, seed=args.seed, timesteps=args.timesteps, num_envs=args.num_envs,
+                 frame_skip=args.frame_skip, max_episode_steps=args.max_episode_steps, normalize=args.normalize, prune=args.prune,
+                 prune_interval=args.prune_interval, warmup=args.warmup, min_trials=args.min_trials,
+                 tensorboard=args.tensorboard)
+    print(format_table(rows))
+    print(f"Results written to {os.path.join(args.output, 'results.csv')}")
+
+if __name__ == "__main__":
+    main()
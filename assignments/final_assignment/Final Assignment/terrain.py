@@ -0,0 +1,135 @@
+import os
+import numpy as np
+from concurrency import atomic_write
+
+# Terrain spans the whole arena, in meters (Simulation is 1600 px wide at 100 px/m)
+TERRAIN_WIDTH = 16.0
+# Height of the flat ground that terrains are built on
+BASE_HEIGHT = 0.5
+# The start (where the humanoid spawns) and the finish (goal and flag) stay flat
+FLAT_START = 3.5
+FLAT_END = 14.0
+
+KINDS = ('flat', 'hills', 'steps', 'obstacles', 'mixed')
+
+class Terrain:
+    """
+    Static ground geometry: a surface polyline and box obstacles standing on it.
+
+    Attributes:
+        surface (np.array): (K, 2) float32 vertices of the ground surface from x=0 to
+            TERRAIN_WIDTH, built as a Box2D chain shape.
+        obstacles (np.array): (M, 4) float32 boxes as (center x, center y, half width, half height).
+        key (tuple): (kind, seed, difficulty), what the terrain was generated from.
+    """
+
+    def __init__(self, surface, obstacles, key):
+        self.surface = np.asarray(surface, dtype=np.float32)
+        self.obstacles = np.asarray(obstacles, dtype=np.float32).reshape(-1, 4)
+        self.key = key
+
+    def height_at(self, x):
+        """Height of the surface at x (obstacles excluded)."""
+        return float(np.interp(x, self.surface[:, 0], self.surface[:, 1]))
+
+    def save(self, path):
+        kind, seed, difficulty = self.key
+        np.savez(path, surface=self.surface, obstacles=self.obstacles,
+                 kind=kind, seed=seed, difficulty=difficulty)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            key = (str(arrays['kind']), int(arrays['seed']), float(arrays['difficulty']))
+            return cls(arrays['surface'], arrays['obstacles'], key)
+
+def _hills(rng, difficulty):
+    """Smooth random heights, sampled every 0.25 m."""
+    x = np.linspace(FLAT_START, FLAT_END, int(round((FLAT_END - FLAT_START) / 0.25)) + 1)
+    # A random walk of slopes, so the hills are smooth rather than jagged
+    slopes = np.cumsum(rng.normal(0.0, 0.08 * difficulty, len(x)))
+    heights = np.cumsum(slopes) * 0.25
+    # Start and end at the base height
+    heights -= np.linspace(heights[0], heights[-1], len(x))
+    heights = np.clip(heights, -0.3, 0.6 * difficulty)
+    return list(zip(x.tolist(), (BASE_HEIGHT + heights).tolist()))
+
+def _steps(rng, difficulty):
+    """Flat segments joined by vertical steps up or down."""
+    points = []
+    x, height = FLAT_START, 0.0
+    while x < FLAT_END - 1.0:
+        points.append((x, BASE_HEIGHT + height))
+        x = min(x + rng.uniform(0.8, 1.6), FLAT_END - 1.0)
+        points.append((x, BASE_HEIGHT + height))
+        height = float(np.clip(height + rng.choice([-1, 1]) * rng.uniform(0.03, 0.12) * difficulty, -0.3, 0.6))
+    # Step back to the base height before the finish
+    points.append((x, BASE_HEIGHT))
+    points.append((FLAT_END, BASE_HEIGHT))
+    return points
+
+def _obstacles(rng, difficulty, surface):
+    """Small boxes standing on the surface."""
+    count = rng.integers(2, 5 + int(4 * difficulty))
+    xs = np.sort(rng.uniform(FLAT_START + 0.5, FLAT_END - 0.5, count))
+    half_widths = rng.uniform(0.05, 0.15, count)
+    half_heights = rng.uniform(0.02, 0.08, count) * difficulty
+    surface = np.asarray(surface)
+    bottoms = np.interp(xs, surface[:, 0], surface[:, 1])
+    return list(zip(xs, bottoms + half_heights, half_widths, half_heights))
+
+def generate_terrain(seed, kind='mixed', difficulty=1.0):
+    """
+    Generate a terrain from a seed.
+
+    Args:
+        seed (int): Seed of the generator, the same seed always gives the same terrain.
+        kind (str): One of KINDS.
+        difficulty (float): Scales the heights of the hills, steps and obstacles.
+
+    Returns:
+        Terrain: The generated terrain.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown terrain kind {kind!r}, expected one of {KINDS}")
+    rng = np.random.default_rng(seed)
+    middle = []
+    if kind in ('hills', 'mixed'):
+        middle = _hills(rng, difficulty)
+    elif kind == 'steps':
+        middle = _steps(rng, difficulty)
+    surface = [(0.0, BASE_HEIGHT)] + middle + [(FLAT_END, BASE_HEIGHT), (TERRAIN_WIDTH, BASE_HEIGHT)]
+    # Drop vertices too close to the previous one, which Box2D chain shapes do not allow
+    kept = [surface[0]]
+    for point in surface[1:]:
+        if np.hypot(point[0] - kept[-1][0], point[1] - kept[-1][1]) > 0.01:
+            kept.append(point)
+    surface = kept
+    obstacles = _obstacles(rng, difficulty, surface) if kind in ('obstacles', 'mixed') else []
+    return Terrain(surface, obstacles, (kind, seed, difficulty))
+
+# Terrains already generated in this process, keyed by (kind, seed, difficulty)
+_terrain_cache = {}
+
+def get_terrain(seed, kind='mixed', difficulty=1.0, cache_dir=None):
+    """
+    Get a terrain, generating it only the first time.
+
+    Terrains are kept for the life of the process. With a cache directory they are also
+    saved to disk, so other processes (e.g. vec env workers) load them instead.
+
+    Returns:
+        Terrain: The shared terrain, which must not be modified.
+    """
+    key = (kind, seed, difficulty)
+    if key not in _terrain_cache:
+        path = os.path.join(cache_dir, f"{kind}_{seed}_{difficulty:g}.npz") if cache_dir else None
+        if path is not None and os.path.exists(path):
+            terrain = Terrain.load(path)
+        else:
+            terrain = generate_terrain(seed, kind, difficulty)
+            if path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                atomic_write(path, terrain.save, ".npz")
+        _terrain_cache[key] = terrain
+    return _terrain_cache[key]
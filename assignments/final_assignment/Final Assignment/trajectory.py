@@ -0,0 +1,220 @@
+import glob
+import json
+import os
+import gymnasium as gym
+import numpy as np
+from concurrency import atomic_write
+from humanoid import STATE_KEYS, STATE_SIZE
+
+# Recorded columns: (dtype, shape of one transition). Observations are wider when the env
+# adds contact channels, see TrajectoryWriter.
+COLUMNS = {
+    'observations': (np.float32, (STATE_SIZE,)),
+    'actions': (np.float32, (4,)),
+    'rewards': (np.float32, ()),
+    'dones': (np.bool_, ()),
+    # Humanoid state after the step, laid out as humanoid.STATE_KEYS (the values of log_state())
+    'states': (np.float32, (STATE_SIZE,)),
+}
+
+def _chunk_path(directory, chunk, column):
+    return os.path.join(directory, f"chunk_{chunk:05d}_{column}.npy")
+
+class TrajectoryWriter:
+    """
+    Streams transitions into memory-mapped, fixed size chunk files, one file per column.
+
+    Each chunk is preallocated on disk with np.lib.format.open_memmap and filled in place,
+    so memory use does not grow with the number of transitions. episodes.bin is an
+    append-only table of int64 (start, length) pairs, one per finished episode, in
+    transitions since the first one. index.json holds the chunk size, the number of
+    transitions and episodes and the columns.
+
+    The index is rewritten whenever an episode ends or a chunk fills, so a recording whose
+    process is killed can still be read up to that point. The chunk memory maps are only
+    synced to disk when a chunk fills and on flush(), so the cost of an episode end does not
+    grow with the size of the recording.
+
+    Files of an earlier recording in the same directory are removed.
+    """
+
+    def __init__(self, directory, chunk_size=65536, observation_size=STATE_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        # Stale chunks would otherwise be read as part of this recording
+        stale = [os.path.join(directory, name) for name in ("index.json", "episodes.bin", "episodes.npy")]
+        for path in stale + glob.glob(os.path.join(directory, "chunk_*.npy")):
+            if os.path.exists(path):
+                os.remove(path)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.columns = dict(COLUMNS, observations=(np.float32, (observation_size,)))
+        self.chunk = None
+        self.chunk_index = -1
+        self.count = 0
+        self.episode_count = 0
+        self.episode_start = 0
+        self.episodes_file = open(os.path.join(directory, "episodes.bin"), "wb")
+
+    def _open_chunk(self):
+        self.chunk_index += 1
+        self.chunk = {column: np.lib.format.open_memmap(_chunk_path(self.directory, self.chunk_index, column),
+                                                        mode='w+', dtype=dtype, shape=(self.chunk_size, *shape))
+                      for column, (dtype, shape) in self.columns.items()}
+
+    def add(self, observation, action, reward, done, state):
+        """Append one transition."""
+        offset = self.count % self.chunk_size
+        if offset == 0:
+            if self.chunk is not None:
+                # The previous chunk is full
+                self.flush()
+            self._open_chunk()
+        chunk = self.chunk
+        chunk['observations'][offset] = observation
+        chunk['actions'][offset] = action
+        chunk['rewards'][offset] = reward
+        chunk['dones'][offset] = done
+        chunk['states'][offset] = state
+        self.count += 1
+        if done:
+            self.end_episode()
+
+    def end_episode(self):
+        """Close the current episode, the next transitions start a new one."""
+        if self.count > self.episode_start:
+            self.episodes_file.write(np.array([self.episode_start, self.count - self.episode_start],
+                                              dtype=np.int64).tobytes())
+            self.episodes_file.flush()
+            self.episode_count += 1
+            self.episode_start = self.count
+            self._write_index()
+
+    def _write_index(self):
+        index = {
+            'chunk_size': self.chunk_size,
+            'transitions': self.count,
+            'episodes': self.episode_count,
+            'columns': {column: [np.dtype(dtype).str, list(shape)] for column, (dtype, shape) in self.columns.items()},
+            'state_keys': list(STATE_KEYS),
+        }
+
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(index, f, indent=2)
+
+        atomic_write(os.path.join(self.directory, "index.json"), write)
+
+    def flush(self):
+        """Sync the chunk in progress, the episode table and the index to disk."""
+        if self.chunk is not None:
+            for array in self.chunk.values():
+                array.flush()
+        self.episodes_file.flush()
+        self._write_index()
+
+    def close(self):
+        """Flush everything, an unfinished episode is kept as the last one."""
+        self.end_episode()
+        self.flush()
+        self.episodes_file.close()
+        self.chunk = None
+
+class TrajectoryRecorder(gym.Wrapper):
+    """
+    Records every transition of the wrapped HumanoidEnv with a TrajectoryWriter.
+    """
+
+    def __init__(self, env, directory, chunk_size=65536):
+        super(TrajectoryRecorder, self).__init__(env)
+        self.writer = TrajectoryWriter(directory, chunk_size, env.observation_space.shape[0])
+        self.observation = None
+
+    def reset(self, **kwargs):
+        # An episode cut short by the reset is still recorded
+        self.writer.end_episode()
+        observation, info = self.env.reset(**kwargs)
+        self.observation = observation
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.writer.add(self.observation, action, reward, terminated or truncated,
+                        self.env.unwrapped.simulation.humanoid.state)
+        self.observation = observation
+        return observation, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        return self.env.close()
+
+class TrajectoryDataset:
+    """
+    Read-only view of a directory written by a TrajectoryWriter.
+
+    The chunk files are memory-mapped, so opening a dataset reads only the index, and an
+    episode is only paged in when it is accessed.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "index.json")) as f:
+            self.index = json.load(f)
+        self.directory = directory
+        self.chunk_size = self.index['chunk_size']
+        self.transitions = self.index['transitions']
+        # Episodes past the count in the index may be partly written
+        episode_count = self.index['episodes']
+        self.episodes = (np.memmap(os.path.join(directory, "episodes.bin"), dtype=np.int64, mode='r',
+                                   shape=(episode_count, 2))
+                         if episode_count else np.empty((0, 2), dtype=np.int64))
+        self.num_chunks = -(-self.transitions // self.chunk_size)
+        self.chunks = [{column: np.load(_chunk_path(directory, chunk, column), mmap_mode='r')
+                        for column in self.index['columns']}
+                       for chunk in range(self.num_chunks)]
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def slice(self, start, stop, column):
+        """
+        Get the transitions start..stop of a column.
+
+        Returns:
+            np.array: A view of the memory map when the range lies in one chunk, a copy otherwise.
+        """
+        stop = min(stop, self.transitions)
+        parts = []
+        while start < stop:
+            chunk, offset = divmod(start, self.chunk_size)
+            length = min(stop - start, self.chunk_size - offset)
+            parts.append(self.chunks[chunk][column][offset:offset + length])
+            start += length
+        if not parts:
+            dtype, shape = self.index['columns'][column]
+            return np.empty((0, *shape), dtype=dtype)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def episode(self, episode, columns=None):
+        """
+        Get the transitions of an episode.
+
+        Args:
+            episode (int): Episode number.
+            columns (list, optional): Columns to read, defaults to all of them.
+
+        Returns:
+            dict: Arrays keyed by column.
+        """
+        start, length = self.episodes[episode]
+        return {column: self.slice(start, start + length, column) for column in (columns or self.index['columns'])}
+
+    def column(self, column):
+        """
+        Iterate over a column chunk by chunk.
+
+        Yields:
+            np.array: The memory-mapped transitions of each chunk.
+        """
+        for chunk in range(self.num_chunks):
+            yield self.slice(chunk * self.chunk_size, (chunk + 1) * self.chunk_size, column)